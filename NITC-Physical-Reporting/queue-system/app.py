@@ -1,33 +1,189 @@
+import csv
+import hashlib
+import io
+import json
+import mimetypes
 import os
-import random
+import sqlite3
+import tempfile
+import threading
+import time
 import uuid
-from datetime import datetime
-from flask import Flask, request, jsonify, render_template, session, send_from_directory, abort, url_for
+import zipfile
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from functools import partial
+from queue import Empty, Full, Queue
+import click
+from flask import Flask, Response, request, jsonify, render_template, session, send_from_directory, abort, url_for, g
+from flask import redirect, send_file, stream_with_context
+from flask import before_render_template, has_request_context, template_rendered
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import text
+from sqlalchemy import and_, event, inspect, literal, or_, select, text, union_all
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, with_loader_criteria
+from werkzeug.security import check_password_hash, generate_password_hash
 from werkzeug.utils import secure_filename
 
+import assets as asset_pipeline
+from audit import BatchWriter, replay
+from estimator import ServiceTimeEstimator
+from metrics import COUNT_BUCKETS, MetricsRegistry
+from scheduler import make_policy, parse_weights
+from throttle import TokenBucketLimiter
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; scans are then stored exactly as uploaded.
+    Image = None
+
+try:
+    import weasyprint
+except (ImportError, OSError):  # optional, and needs Pango; without it slips print from the HTML page.
+    weasyprint = None
+
 app = Flask(__name__)
 
-# CONFIG
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///users.db'
-app.config['SECRET_KEY'] = "secret"
+# CONFIG (all from the environment; the fallbacks are for local development)
+DEV_SECRET_KEY = "secret"
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000))
+# Request threads per worker process; gunicorn.conf.py reads the same variable.
+WORKER_THREADS = int(os.environ.get("GUNICORN_THREADS", 32))
+
+
+def database_url():
+    url = os.environ.get("DATABASE_URL", "sqlite:///users.db")
+    # Some hosts still hand out the scheme SQLAlchemy 1.4 dropped.
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://"):]
+    return url
+
+
+def engine_options(url):
+    # One pooled connection per request thread; the overflow covers the
+    # background threads (queue relay, sweeper, audit writer, document workers).
+    pool = {
+        "pool_size": int(os.environ.get("DB_POOL_SIZE", WORKER_THREADS)),
+        "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", 10)),
+    }
+    if url.startswith("sqlite"):
+        options = {"connect_args": {"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}}
+        # In-memory databases use a single-connection pool without these settings.
+        return options if ":memory:" in url or url == "sqlite://" else {**options, **pool}
+    return {
+        **pool,
+        "pool_timeout": float(os.environ.get("DB_POOL_TIMEOUT", 10)),
+        "pool_recycle": int(os.environ.get("DB_POOL_RECYCLE", 1800)),
+        "pool_pre_ping": True,
+    }
+
+
+app.config['SQLALCHEMY_DATABASE_URI'] = database_url()
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', DEV_SECRET_KEY)
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_CONTENT_LENGTH', 16 * 1024 * 1024))
 
 db = SQLAlchemy(app)
-UPLOAD_DIR = os.path.join(app.instance_path, "uploads")
+
+
+@event.listens_for(Engine, "connect")
+def configure_sqlite_connection(dbapi_connection, _connection_record):
+    # WAL lets page reads carry on while a booking is being written, and
+    # busy_timeout makes concurrent writers wait instead of failing.
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+UPLOAD_DIR = os.environ.get("UPLOAD_DIR") or os.path.join(app.instance_path, "uploads")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
+THUMBNAIL_DIR = os.path.join(app.instance_path, "thumbnails")
+os.makedirs(THUMBNAIL_DIR, exist_ok=True)
+SLIP_DIR = os.path.join(app.instance_path, "slips")
+os.makedirs(SLIP_DIR, exist_ok=True)
+
+UPLOAD_CHUNK_SIZE = 64 * 1024
+MAX_DOCUMENT_BYTES = int(os.environ.get("MAX_DOCUMENT_BYTES", 8 * 1024 * 1024))
+DOCUMENT_MAX_DIMENSION = 2000
+DOCUMENT_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"%PDF-", ".pdf"),
+)
+DOCUMENT_LABELS = {
+    "class10": "Class 10 certificate",
+    "class12": "Class 12 certificate",
+    "category": "Category certificate",
+    "receipt": "Fee receipt",
+}
+document_workers = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("DOCUMENT_WORKERS", 2)), thread_name_prefix="documents"
+)
+
+# Stored documents never change name or content, so browsers may keep them.
+DOCUMENT_MAX_AGE = 365 * 24 * 60 * 60
+THUMBNAIL_SIZE = 320
+THUMBNAIL_CACHE_BYTES = int(os.environ.get("THUMBNAIL_CACHE_BYTES", 64 * 1024 * 1024))
+
+QUICK_REVIEW_MINUTES = 3
+DETAILED_REVIEW_MINUTES = 6
+
+# Off by default: with METRICS_ENABLED unset no hooks are installed at all.
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "").lower() in ("1", "true", "yes")
+# Shared by the worker processes so a scrape of any one of them reports totals for all.
+METRICS_DIR = os.environ.get("METRICS_DIR") or os.path.join(app.instance_path, "metrics")
+SLOW_QUERY_SECONDS = float(os.environ.get("SLOW_QUERY_SECONDS", 0.1))
+
+# Any werkzeug method string, e.g. "scrypt:32768:8:1" or "pbkdf2:sha256:600000".
+PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD", "scrypt:16384:8:1")
+PASSWORD_HASH_PREFIXES = ("scrypt:", "pbkdf2:")
+password_workers = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("PASSWORD_WORKERS", os.cpu_count() or 2)), thread_name_prefix="passwords"
+)
+# Logins allowed to wait for a hash check at once; further ones are refused.
+LOGIN_PENDING_MAX = int(os.environ.get("LOGIN_PENDING_MAX", 64))
+login_slots = threading.BoundedSemaphore(LOGIN_PENDING_MAX)
+# Many students share the campus NAT address, so the per-address bucket is
+# generous; the per-account bucket is what stops password guessing.
+login_ip_limiter = TokenBucketLimiter(
+    rate=float(os.environ.get("LOGIN_IP_RATE", 10)), burst=int(os.environ.get("LOGIN_IP_BURST", 100))
+)
+login_email_limiter = TokenBucketLimiter(
+    rate=float(os.environ.get("LOGIN_EMAIL_RATE", 0.2)), burst=int(os.environ.get("LOGIN_EMAIL_BURST", 5))
+)
+CREDENTIAL_CACHE_SECONDS = float(os.environ.get("CREDENTIAL_CACHE_SECONDS", 60))
+
+# Counters per hall, e.g. VERIFICATION_COUNTERS="desk-1,desk-2,desk-3".
+HALL_COUNTERS = {
+    "verification": [c.strip() for c in os.environ.get("VERIFICATION_COUNTERS", "desk-1").split(",") if c.strip()],
+    "chanakya": [c.strip() for c in os.environ.get("CHANAKYA_COUNTERS", "hall-1").split(",") if c.strip()],
+}
+# How a free verification counter picks between the X and Y lanes: fifo, weighted or sej.
+# The live status position and ETA always count the bookings before a student in
+# id (FIFO) order, so under weighted or sej they are an estimate, not a promise.
+LANE_POLICY = os.environ.get("LANE_POLICY", "fifo")
+LANE_WEIGHTS = os.environ.get("LANE_WEIGHTS", "X:2,Y:1")
+LANE_MAX_WAIT_MINUTES = float(os.environ.get("LANE_MAX_WAIT_MINUTES", 30))
+# Longest another worker process's capacity change can go unseen here.
+SLOT_CACHE_SECONDS = float(os.environ.get("SLOT_CACHE_SECONDS", 2))
 
 # ---------------- MODELS ---------------- #
 
 class Student(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(100), unique=True)
-    password = db.Column(db.String(100))
+    password = db.Column(db.String(255))  # werkzeug password hash
 
 class Admin(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(100), unique=True)
-    password = db.Column(db.String(100))
+    password = db.Column(db.String(255))  # werkzeug password hash
 
 
 class Slot(db.Model):
@@ -35,7 +191,52 @@ class Slot(db.Model):
     time = db.Column(db.String(50), unique=True)
     capacity = db.Column(db.Integer)
 
-class TokenBooking(db.Model):
+class TokenCounter(db.Model):
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, nullable=False)
+
+class SchemaMigration(db.Model):
+    version = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100))
+    applied_at = db.Column(db.String(50))
+
+class StoredDocument(db.Model):
+    """How many bookings refer to a file in UPLOAD_DIR."""
+    name = db.Column(db.String(255), primary_key=True)  # sha256 of the uploaded bytes + extension
+    refs = db.Column(db.Integer, nullable=False)
+    normalized_at = db.Column(db.DateTime)               # set once the scan's bytes are final
+
+class QueueEvent(db.Model):
+    """A queue change waiting to be relayed to every worker's /queue/stream subscribers."""
+    __table_args__ = (db.Index("ix_queue_event_created_at", "created_at"),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    event = db.Column(db.String(40), nullable=False)
+    public = db.Column(db.Text, nullable=False)    # JSON sent to every subscriber
+    private = db.Column(db.Text)                   # JSON added for admin subscribers
+    created_at = db.Column(db.DateTime, nullable=False)
+
+class AuditEvent(db.Model):
+    """Append-only record of a queue transition; rows are never updated."""
+    __table_args__ = (
+        db.Index("ix_audit_event_booking", "booking_id", "id"),
+        db.Index("ix_audit_event_created_at", "created_at"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    event = db.Column(db.String(40), nullable=False)
+    booking_id = db.Column(db.Integer)             # kept after the booking itself is deleted
+    token_id = db.Column(db.String(20))
+    student_email = db.Column(db.String(100))
+    queue = db.Column(db.String(1))                # X or Y
+    slot_time = db.Column(db.String(50))
+    actor = db.Column(db.String(100))              # admin (or student) who caused it
+    counter = db.Column(db.String(50))
+    detail = db.Column(db.Text)                    # JSON
+    created_at = db.Column(db.DateTime, nullable=False)
+
+class BookingColumns:
+    """Columns shared by live and archived token bookings."""
     id = db.Column(db.Integer, primary_key=True)
     student_email = db.Column(db.String(100))
     fee_status = db.Column(db.String(20))
@@ -50,6 +251,75 @@ class TokenBooking(db.Model):
     admin1_notes = db.Column(db.Text)
     final_registration_completed = db.Column(db.Boolean, default=False)
     final_registration_completed_at = db.Column(db.String(50))
+    booked_at = db.Column(db.DateTime)
+    sent_to_chanakya_at = db.Column(db.DateTime)
+    registration_completed_at = db.Column(db.DateTime)
+    slip_file = db.Column(db.String(100))          # content-addressed PDF in SLIP_DIR
+    desk_counter = db.Column(db.String(50))        # verification counter that called the student
+    chanakya_counter = db.Column(db.String(50))    # Chanakya hall counter that called the student
+    rejected_at = db.Column(db.DateTime)           # soft delete; rejected rows are hidden from live queries
+    documents_swept_at = db.Column(db.DateTime)    # when the upload sweeper removed its documents
+
+def live_index(name, *columns, **kwargs):
+    """An index over live (not rejected) bookings only, matching hide_rejected_bookings."""
+    return db.Index(
+        name, *columns, sqlite_where=text("rejected_at IS NULL"), postgresql_where=text("rejected_at IS NULL"),
+        **kwargs,
+    )
+
+
+# Route queries always carry rejected_at IS NULL, so their indexes cover live rows only.
+LIVE_BOOKING_INDEXES = (
+    "ix_token_booking_waiting", "ix_token_booking_student", "ix_token_booking_slot", "ix_token_booking_fee",
+    "ix_token_booking_sent_at", "ix_token_booking_desk_counter", "ix_token_booking_chanakya_counter",
+)
+
+
+class TokenBooking(BookingColumns, db.Model):
+    __table_args__ = (
+        live_index("ix_token_booking_waiting", "sent_to_chanakya", "id"),
+        live_index("ix_token_booking_student", "student_email", "id"),
+        live_index("ix_token_booking_slot", "slot_time"),
+        live_index("ix_token_booking_fee", "fee_status", "id"),
+        live_index("ix_token_booking_sent_at", "sent_to_chanakya_at"),
+        live_index("ix_token_booking_desk_counter", "desk_counter"),
+        live_index("ix_token_booking_chanakya_counter", "chanakya_counter"),
+        # The upload sweeper's queue: rejected bookings whose documents are still stored.
+        db.Index(
+            "ix_token_booking_unswept", "id",
+            sqlite_where=text("rejected_at IS NOT NULL AND documents_swept_at IS NULL"),
+            postgresql_where=text("rejected_at IS NOT NULL AND documents_swept_at IS NULL"),
+        ),
+        # One live booking per student, enforced even for concurrent submits.
+        live_index("ux_token_booking_live_student", "student_email", unique=True),
+    )
+
+class ArchivedBooking(BookingColumns, db.Model):
+    """A finished booking moved out of token_booking by `flask archive-bookings`."""
+    __table_args__ = (
+        db.Index("ix_archived_booking_student", "student_email", "id"),
+        db.Index("ix_archived_booking_slot", "slot_time"),
+    )
+
+    archived_at = db.Column(db.DateTime)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def hide_rejected_bookings(state):
+    """Leave rejected bookings out of every ORM query unless it asks for them.
+
+    Pass `.execution_options(include_rejected=True)` to see them, as the
+    upload sweeper does.
+    """
+    if (
+        (state.is_select or state.is_update or state.is_delete)
+        and not state.is_column_load
+        and not state.is_relationship_load
+        and not state.execution_options.get("include_rejected", False)
+    ):
+        state.statement = state.statement.options(
+            with_loader_criteria(TokenBooking, lambda cls: cls.rejected_at.is_(None), include_aliases=True)
+        )
 
 
 def parse_identity_from_email(email):
@@ -75,52 +345,500 @@ def capacity_units_for_fee(fee_status):
     return 1 if (fee_status or "").lower() == "yes" else 2
 
 
+def document_url(doc_name):
+    return f"/uploads/{doc_name}" if doc_name else None
+
+
+def document_thumbnail_url(doc_name):
+    if not doc_name or not doc_name.endswith((".png", ".jpg", ".jpeg")):
+        return None
+    return f"/thumbnails/{doc_name}"
+
+
+class BookingProjection:
+    """Display fields derived from the columns a booking never changes.
+
+    Email, fee status, payment mode and documents are fixed when the
+    booking is made, so these strings are computed once per booking.
+    """
+
+    __slots__ = ("token_id", "student_name", "roll_no", "queue_type", "payment_label", "doc_urls", "thumb_urls")
+
+    def __init__(self, token_id, student_email, fee_status, payment_mode, doc_names):
+        identity = parse_identity_from_email(student_email)
+        self.token_id = token_id
+        self.student_name = identity["name"]
+        self.roll_no = identity["roll_no"]
+        self.queue_type = "X (Quick Review)" if (fee_status or "").lower() == "yes" else "Y (Detailed Consultation)"
+        self.payment_label = payment_label(payment_mode)
+        self.doc_urls = tuple(document_url(name) for name in doc_names) if doc_names else None
+        self.thumb_urls = tuple(document_thumbnail_url(name) for name in doc_names) if doc_names else None
+
+
+class BookingProjectionCache:
+    """Bounded cache of BookingProjection by booking id.
+
+    Entries are checked against the token id as well, which is never
+    reused, so an id SQLite hands out again after a delete cannot pick up
+    the old booking's projection. Nothing else about a cached projection
+    can go stale, which keeps worker processes consistent without any
+    cross-process invalidation.
+    """
+
+    def __init__(self, max_entries=20_000):
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, row, doc_names=None):
+        with self._lock:
+            projection = self._entries.get(row.id)
+            if projection is not None and projection.token_id == row.token_id and (
+                doc_names is None or projection.doc_urls is not None
+            ):
+                return projection
+        projection = BookingProjection(row.token_id, row.student_email, row.fee_status, row.payment_mode, doc_names)
+        with self._lock:
+            self._entries.pop(row.id, None)
+            self._entries[row.id] = projection
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return projection
+
+    def discard(self, booking_id):
+        with self._lock:
+            self._entries.pop(booking_id, None)
+
+
+booking_projections = BookingProjectionCache()
+
+
 def booking_to_view(booking):
-    identity = parse_identity_from_email(booking.student_email)
+    projection = booking_projections.get(booking, (
+        booking.class10_doc, booking.class12_doc, booking.category_doc, booking.paid_receipt_doc,
+    ))
+    class10_url, class12_url, category_url, receipt_url = projection.doc_urls
+    class10_thumb, class12_thumb, category_thumb, receipt_thumb = projection.thumb_urls
     return {
         "id": booking.id,
         "token_id": booking.token_id,
         "student_email": booking.student_email,
-        "student_name": identity["name"],
-        "roll_no": identity["roll_no"],
+        "student_name": projection.student_name,
+        "roll_no": projection.roll_no,
         "fee_status": booking.fee_status,
         "slot_time": booking.slot_time,
         "payment_mode": booking.payment_mode,
-        "payment_label": payment_label(booking.payment_mode),
-        "queue_type": "X (Quick Review)" if (booking.fee_status or "").lower() == "yes" else "Y (Detailed Consultation)",
+        "payment_label": projection.payment_label,
+        "queue_type": projection.queue_type,
         "sent_to_chanakya": bool(booking.sent_to_chanakya),
-        "class10_doc_url": f"/uploads/{booking.class10_doc}" if booking.class10_doc else None,
-        "class12_doc_url": f"/uploads/{booking.class12_doc}" if booking.class12_doc else None,
-        "category_doc_url": f"/uploads/{booking.category_doc}" if booking.category_doc else None,
-        "paid_receipt_doc_url": f"/uploads/{booking.paid_receipt_doc}" if booking.paid_receipt_doc else None,
+        "class10_doc_url": class10_url,
+        "class12_doc_url": class12_url,
+        "category_doc_url": category_url,
+        "paid_receipt_doc_url": receipt_url,
+        "class10_thumb_url": class10_thumb,
+        "class12_thumb_url": class12_thumb,
+        "category_thumb_url": category_thumb,
+        "paid_receipt_thumb_url": receipt_thumb,
         "admin1_notes": booking.admin1_notes or "",
         "final_registration_completed": bool(booking.final_registration_completed),
         "final_registration_completed_at": booking.final_registration_completed_at or "",
+        "desk_counter": booking.desk_counter,
+        "chanakya_counter": booking.chanakya_counter,
     }
 
 
-def save_uploaded_file(file_obj, email, label):
+# Columns the admin list cards need; pages project only these.
+BOOKING_LIST_COLUMNS = (
+    TokenBooking.id,
+    TokenBooking.token_id,
+    TokenBooking.student_email,
+    TokenBooking.fee_status,
+    TokenBooking.slot_time,
+    TokenBooking.payment_mode,
+    TokenBooking.sent_to_chanakya,
+    TokenBooking.final_registration_completed,
+)
+
+BOOKING_PAGE_SIZE = 50
+BOOKING_PAGE_MAX = 200
+QUEUE_FEE_STATUS = {"X": "yes", "Y": "no"}
+
+
+def booking_to_list_item(row):
+    projection = booking_projections.get(row)
+    return {
+        "id": row.id,
+        "token_id": row.token_id,
+        "student_email": row.student_email,
+        "student_name": projection.student_name,
+        "roll_no": projection.roll_no,
+        "fee_status": row.fee_status,
+        "slot_time": row.slot_time,
+        "payment_label": projection.payment_label,
+        "queue_type": projection.queue_type,
+        "sent_to_chanakya": bool(row.sent_to_chanakya),
+        "final_registration_completed": bool(row.final_registration_completed),
+    }
+
+
+def filter_bookings(query, fee_status=None, slot_time=None, sent_to_chanakya=None):
+    if fee_status is not None:
+        query = query.filter(TokenBooking.fee_status == fee_status)
+    if slot_time is not None:
+        query = query.filter(TokenBooking.slot_time == slot_time)
+    if sent_to_chanakya is not None:
+        query = query.filter(TokenBooking.sent_to_chanakya == sent_to_chanakya)
+    return query
+
+
+def booking_page(after=None, limit=BOOKING_PAGE_SIZE, descending=True, **filters):
+    """Return one keyset page of list items and the cursor for the next one."""
+    query = filter_bookings(db.session.query(*BOOKING_LIST_COLUMNS), **filters)
+    if after is not None:
+        query = query.filter(TokenBooking.id < after if descending else TokenBooking.id > after)
+    order = TokenBooking.id.desc() if descending else TokenBooking.id.asc()
+    rows = query.order_by(order).limit(limit + 1).all()
+    next_cursor = rows[limit - 1].id if len(rows) > limit else None
+    return [booking_to_list_item(row) for row in rows[:limit]], next_cursor
+
+
+def count_bookings(**filters):
+    return filter_bookings(db.session.query(TokenBooking.id), **filters).count()
+
+
+def find_booking(booking_id):
+    """Look a booking up by id in the live table, then in the archive."""
+    booking = TokenBooking.query.get(booking_id)
+    if booking is None:
+        booking = ArchivedBooking.query.filter_by(id=booking_id, rejected_at=None).first()
+    return booking
+
+
+def latest_booking_for(email):
+    """The student's newest live booking, or their archived one once it has been archived."""
+    booking = TokenBooking.query.filter_by(student_email=email).order_by(TokenBooking.id.desc()).first()
+    if booking is None:
+        booking = ArchivedBooking.query.filter_by(student_email=email, rejected_at=None) \
+            .order_by(ArchivedBooking.id.desc()).first()
+    return booking
+
+
+class UploadError(ValueError):
+    pass
+
+
+def save_uploaded_file(file_obj, label):
+    """Stream an upload into UPLOAD_DIR in chunks; returns (stored name, newly stored).
+
+    The file type is taken from its leading bytes, not the client's file
+    name, and anything over MAX_DOCUMENT_BYTES is discarded as it streams.
+    Files are named by the SHA-256 of the uploaded bytes, so a scan that
+    is already stored (a retried booking) is kept once and shared.
+    """
     if not file_obj or not file_obj.filename:
-        return None
-    safe_name = secure_filename(file_obj.filename)
-    _, ext = os.path.splitext(safe_name)
-    base_email = (email or "student").replace("@", "_at_").replace(".", "_")
-    unique_name = f"{base_email}_{label}_{uuid.uuid4().hex[:10]}{ext}"
-    file_obj.save(os.path.join(UPLOAD_DIR, unique_name))
-    return unique_name
+        return None, False
+    document = DOCUMENT_LABELS.get(label, label)
+    head = file_obj.stream.read(UPLOAD_CHUNK_SIZE)
+    ext = next((ext for signature, ext in DOCUMENT_SIGNATURES if head.startswith(signature)), None)
+    if ext is None:
+        raise UploadError(f"{document} must be a PDF, PNG or JPEG file.")
+    partial_path = os.path.join(UPLOAD_DIR, f"{uuid.uuid4().hex}.part")
+    digest = hashlib.sha256()
+    written = 0
+    started = time.perf_counter()
+    try:
+        with open(partial_path, "wb") as out:
+            chunk = head
+            while chunk:
+                written += len(chunk)
+                if written > MAX_DOCUMENT_BYTES:
+                    raise UploadError(f"{document} is larger than {MAX_DOCUMENT_BYTES // (1024 * 1024)} MB.")
+                digest.update(chunk)
+                out.write(chunk)
+                chunk = file_obj.stream.read(UPLOAD_CHUNK_SIZE)
+        stored_name = digest.hexdigest() + ext
+        path = os.path.join(UPLOAD_DIR, stored_name)
+        created = False
+        try:
+            # Already stored: keep that copy (it may be normalised) and mark it
+            # fresh so the sweeper leaves it alone until this booking commits.
+            os.utime(path)
+        except FileNotFoundError:
+            os.replace(partial_path, path)
+            created = True
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+    if metrics is not None:
+        metrics.observe("nitc_upload_write_seconds", time.perf_counter() - started)
+        metrics.increment("nitc_upload_bytes_total", written)
+    return stored_name, created
+
+
+def is_normalizable(filename):
+    return Image is not None and filename.endswith((".png", ".jpg"))
+
+
+def normalize_document(filename):
+    """Downscale and recompress a stored scan in place, keeping its name.
+
+    Runs once per newly stored file. Until it has finished the bytes behind
+    the name may still change, so StoredDocument.normalized_at is only set
+    afterwards (also when there was nothing to gain or the scan was unreadable).
+    """
+    if not is_normalizable(filename):
+        return
+    path = os.path.join(UPLOAD_DIR, filename)
+    fd, temp_path = tempfile.mkstemp(dir=UPLOAD_DIR, prefix=f"{filename}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as out, Image.open(path) as original:
+            image = ImageOps.exif_transpose(original)
+            image.thumbnail((DOCUMENT_MAX_DIMENSION, DOCUMENT_MAX_DIMENSION))
+            if filename.endswith(".jpg"):
+                image.convert("RGB").save(out, "JPEG", quality=85, optimize=True, progressive=True)
+            else:
+                image.save(out, "PNG", optimize=True)
+        # Keep whichever is smaller, and never resurrect a file that was rejected meanwhile.
+        if os.path.exists(path) and os.path.getsize(temp_path) < os.path.getsize(path):
+            os.replace(temp_path, path)
+    except (OSError, ValueError, Image.DecompressionBombError) as exc:
+        app.logger.warning("Could not normalise %s: %s", filename, exc)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    with app.app_context():
+        StoredDocument.query.filter_by(name=filename).update(
+            {StoredDocument.normalized_at: datetime.now()}, synchronize_session=False
+        )
+        db.session.commit()
+
+
+def document_is_final(filename):
+    """True once the bytes behind a stored name can no longer change."""
+    if not is_normalizable(filename):
+        return True
+    normalized_at = db.session.query(StoredDocument.normalized_at).filter_by(name=filename).scalar()
+    return normalized_at is not None
+
+
+def schedule_document_normalization(doc_names):
+    for doc_name in doc_names:
+        if doc_name:
+            document_workers.submit(normalize_document, doc_name)
+
+
+class ThumbnailCache:
+    """On-disk cache of document thumbnails, evicted least recently used first.
+
+    Thumbnails are rendered on first request and kept in THUMBNAIL_DIR until
+    the cache grows past `max_bytes`. Recency is tracked in memory and seeded
+    from file modification times when the process starts.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self._directory = directory
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = None  # thumbnail name -> size in bytes, oldest first
+        self._total_bytes = 0
+
+    def _load(self):
+        entries = []
+        for entry in os.scandir(self._directory):
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+        self._entries = OrderedDict((name, size) for _, name, size in sorted(entries))
+        self._total_bytes = sum(self._entries.values())
+
+    def _render(self, filename, name):
+        path = os.path.join(self._directory, name)
+        # A temp file of its own, as another thread or worker may render the same thumbnail.
+        fd, temp_path = tempfile.mkstemp(dir=self._directory, prefix=f"{name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as out, Image.open(os.path.join(UPLOAD_DIR, filename)) as original:
+                image = ImageOps.exif_transpose(original)
+                image.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+                image.convert("RGB").save(out, "JPEG", quality=80, optimize=True)
+            size = os.path.getsize(temp_path)
+            os.replace(temp_path, path)
+        except (OSError, ValueError, Image.DecompressionBombError) as exc:
+            app.logger.warning("Could not render thumbnail for %s: %s", filename, exc)
+            return None
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return size
+
+    def get(self, filename):
+        """Return the thumbnail file name for an upload, or None if it has none."""
+        if Image is None or document_thumbnail_url(filename) is None:
+            return None
+        name = os.path.splitext(filename)[0] + ".jpg"
+        with self._lock:
+            if self._entries is None:
+                self._load()
+            if name in self._entries:
+                # Another worker shares the directory and may have evicted it.
+                if os.path.isfile(os.path.join(self._directory, name)):
+                    self._entries.move_to_end(name)
+                    return name
+                self._total_bytes -= self._entries.pop(name)
+        size = self._render(filename, name)
+        if size is None:
+            return None
+        with self._lock:
+            self._total_bytes += size - self._entries.pop(name, 0)
+            self._entries[name] = size
+            while self._total_bytes > self._max_bytes and len(self._entries) > 1:
+                evicted, evicted_size = self._entries.popitem(last=False)
+                self._total_bytes -= evicted_size
+                try:
+                    os.remove(os.path.join(self._directory, evicted))
+                except FileNotFoundError:
+                    pass
+        return name
+
+    def discard(self, filename):
+        """Delete an upload's thumbnail, if any; returns the bytes freed."""
+        name = os.path.splitext(filename)[0] + ".jpg"
+        with self._lock:
+            if self._entries is not None:
+                self._total_bytes -= self._entries.pop(name, 0)
+            try:
+                size = os.path.getsize(os.path.join(self._directory, name))
+                os.remove(os.path.join(self._directory, name))
+            except FileNotFoundError:
+                return 0
+        return size
+
+
+thumbnails = ThumbnailCache(THUMBNAIL_DIR, THUMBNAIL_CACHE_BYTES)
+
+
+def reserve_slot_capacity(slot_time, units):
+    """Atomically take `units` seats from a slot; False if it does not have them.
+
+    The check and the decrement happen in one conditional UPDATE, so
+    concurrent bookings (across threads or worker processes) cannot both
+    pass the check and oversell the slot.
+    """
+    reserved = Slot.query.filter(Slot.time == slot_time, Slot.capacity >= units).update(
+        {Slot.capacity: Slot.capacity - units}, synchronize_session=False
+    )
+    return reserved == 1
+
+
+def release_slot_capacity(slot_time, units):
+    Slot.query.filter(Slot.time == slot_time).update(
+        {Slot.capacity: Slot.capacity + units}, synchronize_session=False
+    )
+
+
+class SlotAvailability:
+    """Cached slot capacities for the booking page and /api/slots.
+
+    Routes that change capacity call refresh() once they have committed,
+    so this process serves the new numbers straight away; changes made by
+    other worker processes are picked up within SLOT_CACHE_SECONDS. The
+    ETag is a digest of the capacities, so every process agrees on it.
+    """
+
+    def __init__(self, max_age):
+        self._max_age = max_age
+        self._lock = threading.Lock()
+        self._slots = None
+        self._etag = None
+        self._loaded_at = 0.0
+
+    def _load(self):
+        # Callers hold self._lock, so a slower refresh cannot overwrite a newer one.
+        rows = db.session.query(Slot.time, Slot.capacity).order_by(Slot.id.asc()).all()
+        self._slots = [{"time": slot_time, "capacity": capacity} for slot_time, capacity in rows]
+        self._etag = hashlib.sha1(json.dumps(self._slots).encode()).hexdigest()[:16]
+        self._loaded_at = time.monotonic()
+
+    def snapshot(self):
+        """Return (slots, etag); the slot list must not be modified."""
+        with self._lock:
+            if self._slots is None or time.monotonic() - self._loaded_at >= self._max_age:
+                self._load()
+            return self._slots, self._etag
+
+    def refresh(self):
+        with self._lock:
+            self._load()
+
+
+slot_availability = SlotAvailability(SLOT_CACHE_SECONDS)
+
+
+def dialect_insert(table):
+    """Return an INSERT for `table` that supports on_conflict_do_update."""
+    dialect = db.engine.dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        raise RuntimeError(f"Upserts are not supported on {dialect}.")
+    return insert(table)
+
+
+def retain_documents(doc_names):
+    """Count a new reference to each stored document, in the caller's transaction."""
+    counts = Counter(name for name in doc_names if name)
+    if not counts:
+        return
+    table = StoredDocument.__table__
+    statement = dialect_insert(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.name], set_={"refs": table.c.refs + statement.excluded.refs}
+    )
+    db.session.execute(statement, [{"name": name, "refs": refs} for name, refs in counts.items()])
+
+
+def release_documents(doc_names):
+    """Drop one reference to each document; returns the names nothing refers to any more."""
+    counts = Counter(name for name in doc_names if name)
+    for name, refs in counts.items():
+        StoredDocument.query.filter_by(name=name).update(
+            {StoredDocument.refs: StoredDocument.refs - refs}, synchronize_session=False
+        )
+    names = StoredDocument.name.in_(counts)
+    kept = {name for (name,) in db.session.query(StoredDocument.name).filter(names, StoredDocument.refs > 0)}
+    StoredDocument.query.filter(names, StoredDocument.refs <= 0).delete(synchronize_session=False)
+    return [name for name in counts if name not in kept]
+
+
+# Legacy tokens were random TKN-100..TKN-999, so the sequence starts above them.
+TOKEN_SEQUENCE_START = 1000
 
 
 def generate_token_id():
-    while True:
-        token = f"TKN-{random.randint(100, 999)}"
-        if not TokenBooking.query.filter_by(token_id=token).first():
-            return token
+    """Issue the next token from the booking sequence.
+
+    The increment is a single UPDATE, so the counter row stays locked until
+    the caller's transaction commits and no two bookings can draw the same
+    number. A rolled-back booking returns its number to the sequence.
+    """
+    TokenCounter.query.filter_by(name="booking").update(
+        {TokenCounter.value: TokenCounter.value + 1}, synchronize_session=False
+    )
+    value = db.session.query(TokenCounter.value).filter_by(name="booking").scalar()
+    return f"TKN-{value}"
+
+
+def add_missing_columns(table, required_columns):
+    existing = {column["name"] for column in inspect(db.session.connection()).get_columns(table)}
+    for column, ddl_type in required_columns.items():
+        if column not in existing:
+            db.session.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+    db.session.commit()
 
 
 def ensure_tokenbooking_columns():
-    rows = db.session.execute(text("PRAGMA table_info(token_booking)")).fetchall()
-    existing = {row[1] for row in rows}
-    required_columns = {
+    add_missing_columns("token_booking", {
         "token_id": "TEXT",
         "class10_doc": "TEXT",
         "class12_doc": "TEXT",
@@ -130,13 +848,1099 @@ def ensure_tokenbooking_columns():
         "admin1_notes": "TEXT",
         "final_registration_completed": "INTEGER DEFAULT 0",
         "final_registration_completed_at": "TEXT",
+    })
+
+
+def add_tokenbooking_timestamps():
+    add_missing_columns("token_booking", {
+        "booked_at": "DATETIME",
+        "sent_to_chanakya_at": "DATETIME",
+        "registration_completed_at": "DATETIME",
+    })
+    create_tokenbooking_indexes("ix_token_booking_sent_at")
+
+
+def hash_stored_passwords():
+    for model in (Student, Admin):
+        users = [user for user in model.query.all() if not is_password_hash(user.password)]
+        for user, hashed in zip(users, hash_passwords(user.password or "" for user in users)):
+            user.password = hashed
+
+
+def add_tokenbooking_counters():
+    add_missing_columns("token_booking", {
+        "desk_counter": "TEXT",
+        "chanakya_counter": "TEXT",
+    })
+    create_tokenbooking_indexes("ix_token_booking_desk_counter", "ix_token_booking_chanakya_counter")
+
+
+def add_tokenbooking_slip_file():
+    add_missing_columns("token_booking", {"slip_file": "TEXT"})
+
+
+def add_tokenbooking_soft_delete():
+    add_missing_columns("token_booking", {
+        "rejected_at": "DATETIME",
+        "documents_swept_at": "DATETIME",
+    })
+    create_tokenbooking_indexes("ix_token_booking_rejected_at")
+
+
+def count_document_references():
+    rows = db.session.query(*BOOKING_DOC_COLUMNS).filter(TokenBooking.documents_swept_at.is_(None)) \
+        .execution_options(include_rejected=True)
+    retain_documents(name for row in rows for name in row)
+
+
+def add_document_normalized_at():
+    add_missing_columns("stored_document", {"normalized_at": "DATETIME"})
+    # Earlier files were normalised (or skipped) when they were uploaded.
+    StoredDocument.query.filter(StoredDocument.normalized_at.is_(None)).update(
+        {StoredDocument.normalized_at: datetime.now()}, synchronize_session=False
+    )
+
+
+def enforce_one_live_booking_per_student():
+    duplicates = [email for (email,) in db.session.query(TokenBooking.student_email)
+                  .group_by(TokenBooking.student_email).having(db.func.count() > 1)]
+    if duplicates:
+        raise RuntimeError(
+            "Reject all but one live booking for: " + ", ".join(sorted(str(email) for email in duplicates))
+        )
+    create_tokenbooking_indexes("ux_token_booking_live_student")
+
+
+def index_live_bookings_only():
+    # Recreate the hot indexes as partial ones; a plain rejected_at index
+    # made the planner walk every live row (e.g. for MAX(sent_to_chanakya_at)).
+    for name in LIVE_BOOKING_INDEXES + ("ix_token_booking_rejected_at",):
+        db.session.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    create_tokenbooking_indexes(*LIVE_BOOKING_INDEXES, "ix_token_booking_unswept")
+
+
+def lowercase_account_emails():
+    # Logins compare in lower case; roster imports and the seed data already store it that way.
+    for model, column in ((Student, "email"), (Admin, "email"),
+                          (TokenBooking, "student_email"), (ArchivedBooking, "student_email")):
+        table = model.__tablename__
+        db.session.execute(text(f"UPDATE {table} SET {column} = lower({column}) WHERE {column} != lower({column})"))
+
+
+def create_tokenbooking_indexes(*names):
+    connection = db.session.connection()
+    for index in TokenBooking.__table__.indexes:
+        if index.name in names:
+            index.create(connection, checkfirst=True)
+
+
+# Append only: each entry runs once per database, in version order.
+MIGRATIONS = [
+    (1, "add token booking columns", ensure_tokenbooking_columns),
+    (2, "index hot token booking lookups", lambda: create_tokenbooking_indexes(
+        "ix_token_booking_waiting", "ix_token_booking_student", "ix_token_booking_slot")),
+    (3, "index token bookings by fee status", lambda: create_tokenbooking_indexes("ix_token_booking_fee")),
+    (4, "timestamp token booking transitions", add_tokenbooking_timestamps),
+    (5, "hash stored passwords", hash_stored_passwords),
+    (6, "assign token bookings to counters", add_tokenbooking_counters),
+    (7, "store final registration slip files", add_tokenbooking_slip_file),
+    (8, "soft delete rejected token bookings", add_tokenbooking_soft_delete),
+    (9, "count stored document references", count_document_references),
+    (10, "record normalised stored documents", add_document_normalized_at),
+    (11, "allow one live booking per student", enforce_one_live_booking_per_student),
+    (12, "index live token bookings only", index_live_bookings_only),
+    (13, "store account emails in lower case", lowercase_account_emails),
+]
+
+
+def run_migrations():
+    applied = {version for (version,) in db.session.query(SchemaMigration.version)}
+    for version, name, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+        migrate()
+        db.session.add(SchemaMigration(
+            version=version,
+            name=name,
+            applied_at=datetime.now().isoformat(timespec="seconds"),
+        ))
+        db.session.commit()
+
+
+# Queries behind the hot routes; `flask check-query-plans` verifies that
+# none of them needs a full table scan.
+HOT_QUERIES = {
+    "student page booking lookup": lambda: TokenBooking.query.filter_by(student_email="student@nitc.ac.in")
+        .order_by(TokenBooking.id.desc()).limit(1),
+    "duplicate booking check": lambda: TokenBooking.query.filter_by(student_email="student@nitc.ac.in").limit(1),
+    "waiting queue": lambda: TokenBooking.query.filter_by(sent_to_chanakya=False).order_by(TokenBooking.id.asc()),
+    "chanakya queue": lambda: TokenBooking.query.filter_by(sent_to_chanakya=True).order_by(TokenBooking.id.asc()),
+    "admin quick list page": lambda: TokenBooking.query.filter(TokenBooking.fee_status == "yes", TokenBooking.id < 1000)
+        .order_by(TokenBooking.id.desc()).limit(51),
+    "last desk departure": lambda: db.session.query(db.func.max(TokenBooking.sent_to_chanakya_at)),
+    "slot lookup": lambda: Slot.query.filter_by(time="9:00 AM - 10:00 AM").limit(1),
+    "verification lane head": lambda: verification_lane_head("X"),
+    "chanakya hall head": lambda: chanakya_hall_head(),
+    "counter current booking": lambda: TokenBooking.query.filter_by(desk_counter="desk-1", sent_to_chanakya=False)
+        .limit(1),
+    "archived booking lookup": lambda: ArchivedBooking.query.filter_by(student_email="student@nitc.ac.in")
+        .order_by(ArchivedBooking.id.desc()).limit(1),
+    "student login": lambda: db.session.query(Student.password).filter_by(email="student@nitc.ac.in").limit(1),
+    "upload sweep batch": lambda: TokenBooking.query.filter(
+        TokenBooking.rejected_at.isnot(None), TokenBooking.documents_swept_at.is_(None), TokenBooking.id > 0,
+    ).order_by(TokenBooking.id.asc()).limit(UPLOAD_SWEEP_BATCH_SIZE).execution_options(include_rejected=True),
+}
+
+
+def executed_sql(build_query):
+    """Run a hot query and return the (SQL, parameters) the ORM sent to the database.
+
+    Explaining build_query().statement would miss criteria added while the
+    query executes, such as hide_rejected_bookings.
+    """
+    executed = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        executed.append((statement, parameters))
+
+    event.listen(db.engine, "before_cursor_execute", capture)
+    try:
+        build_query().all()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", capture)
+    return executed[-1]
+
+
+@app.cli.command("check-query-plans")
+def check_query_plans_command():
+    """Fail if a hot route query needs a full table scan (SQLite only).
+
+    A search keyed on rejected_at alone counts as a scan: it visits every live row.
+    """
+    if db.engine.dialect.name != "sqlite":
+        click.echo(f"EXPLAIN QUERY PLAN is SQLite specific; skipping on {db.engine.dialect.name}.")
+        return
+    full_scans = 0
+    for label, build_query in HOT_QUERIES.items():
+        statement, parameters = executed_sql(build_query)
+        details = [row[-1] for row in db.session.connection().exec_driver_sql(
+            f"EXPLAIN QUERY PLAN {statement}", parameters
+        )]
+        scans = [d for d in details if (d.startswith("SCAN ") and "INDEX" not in d) or d.endswith("(rejected_at=?)")]
+        full_scans += len(scans)
+        click.echo(f"{'FULL SCAN' if scans else 'ok':<10} {label}: {'; '.join(details)}")
+    if full_scans:
+        raise SystemExit(1)
+
+
+
+# ---------------- QUEUE INDEX ---------------- #
+
+def _fenwick_append(tree, value):
+    index = len(tree)
+    total = value
+    j = index - 1
+    stop = index - (index & -index)
+    while j > stop:
+        total += tree[j]
+        j -= j & -j
+    tree.append(total)
+
+
+def _fenwick_add(tree, index, delta):
+    while index < len(tree):
+        tree[index] += delta
+        index += index & -index
+
+
+def _fenwick_prefix(tree, index):
+    total = 0
+    while index > 0:
+        total += tree[index]
+        index -= index & -index
+    return total
+
+
+class QueueIndex:
+    """In-memory copy of the waiting (not yet sent to Chanakya) queue.
+
+    Bookings are kept in id order with Fenwick trees of quick (X) and
+    detailed (Y) counts, so "who is ahead of me" is answered in O(log n)
+    without loading the queue from the database. The index is loaded
+    lazily from the database and then updated in place by the routes that
+    change the queue. It is per process: each worker keeps its own copy,
+    so every read first compares the database's queue version (bumped in
+    the same transaction as each change) and reloads if another worker
+    has changed the queue since.
+
+    Positions assume the queue is served in id order. That is exact for
+    the fifo lane policy; weighted and sej call students out of id order,
+    so for them "ahead of me" and "now serving" are approximations.
+    """
+
+    COMPACT_THRESHOLD = 1024
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._version = None
+        self._clear()
+
+    def _clear(self):
+        self._entries = []      # position -> [booking_id, token_id, email, is_quick] or None once removed
+        self._quick = [0]       # Fenwick tree (1-based) of X bookings per position
+        self._detailed = [0]    # Fenwick tree (1-based) of Y bookings per position
+        self._positions = {}    # booking_id -> position
+        self._by_email = {}     # student_email -> position
+        self._head = 0
+        self._removed = 0
+
+    def _append(self, booking_id, token_id, email, fee_status):
+        is_quick = (fee_status or "").lower() == "yes"
+        position = len(self._entries)
+        self._entries.append([booking_id, token_id, email, is_quick])
+        _fenwick_append(self._quick, 1 if is_quick else 0)
+        _fenwick_append(self._detailed, 0 if is_quick else 1)
+        self._positions[booking_id] = position
+        self._by_email.setdefault(email, position)
+
+    def _load(self, version):
+        rows = db.session.query(
+            TokenBooking.id, TokenBooking.token_id, TokenBooking.student_email, TokenBooking.fee_status
+        ).filter_by(sent_to_chanakya=False).order_by(TokenBooking.id.asc()).all()
+        self._clear()
+        for row in rows:
+            self._append(*row)
+        self._version = version
+        self._loaded = True
+
+    def _ensure_loaded(self):
+        version = current_queue_version()
+        if not self._loaded or version != self._version:
+            self._load(version)
+
+    def _advance(self, version):
+        """True if `version` directly follows ours, so a local change can be applied in place."""
+        if not self._loaded or version is None or self._version is None or version != self._version + 1:
+            self.invalidate()
+            return False
+        self._version = version
+        return True
+
+    def _compact(self):
+        live = [entry for entry in self._entries if entry is not None]
+        self._clear()
+        for booking_id, token_id, email, is_quick in live:
+            self._append(booking_id, token_id, email, "yes" if is_quick else "no")
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded = False
+            self._version = None
+            self._clear()
+
+    def add(self, booking, version):
+        with self._lock:
+            if not self._advance(version):
+                return
+            if self._entries and self._entries[-1] is not None and booking.id <= self._entries[-1][0]:
+                # Out-of-order id (should not happen with autoincrementing keys): reload on next read.
+                self.invalidate()
+                return
+            if booking.id in self._positions:
+                return
+            self._append(booking.id, booking.token_id, booking.student_email, booking.fee_status)
+
+    def remove(self, booking_id, version):
+        with self._lock:
+            if not self._advance(version):
+                return
+            position = self._positions.pop(booking_id, None)
+            if position is None:
+                return
+            _, _, email, is_quick = self._entries[position]
+            _fenwick_add(self._quick if is_quick else self._detailed, position + 1, -1)
+            self._entries[position] = None
+            if self._by_email.get(email) == position:
+                del self._by_email[email]
+            self._removed += 1
+            while self._head < len(self._entries) and self._entries[self._head] is None:
+                self._head += 1
+            if self._removed > self.COMPACT_THRESHOLD and self._removed > len(self._positions):
+                self._compact()
+
+    def _tokens_from_head(self, limit):
+        tokens = []
+        position = self._head
+        while position < len(self._entries) and len(tokens) < limit:
+            entry = self._entries[position]
+            if entry is not None:
+                tokens.append(entry[1])
+            position += 1
+        return tokens
+
+    def status_for(self, email):
+        with self._lock:
+            self._ensure_loaded()
+            head_tokens = self._tokens_from_head(6)
+            position = self._by_email.get(email) if email else None
+            x_count = y_count = 0
+            student_token = "--"
+            if position is not None:
+                student_token = self._entries[position][1] or "--"
+                x_count = _fenwick_prefix(self._quick, position)
+                y_count = _fenwick_prefix(self._detailed, position)
+            return {
+                "now_serving_token": head_tokens[0] if head_tokens and head_tokens[0] else "--",
+                "upcoming_tokens": [token for token in head_tokens[1:6] if token],
+                "booking_id": self._entries[position][0] if position is not None else None,
+                "student_token": student_token,
+                "x_count": x_count,
+                "y_count": y_count,
+            }
+
+    def depth(self):
+        """Number of waiting bookings per queue type."""
+        with self._lock:
+            self._ensure_loaded()
+            size = len(self._entries)
+            return {"X": _fenwick_prefix(self._quick, size), "Y": _fenwick_prefix(self._detailed, size)}
+
+
+def bump_queue_version():
+    """Mark the waiting queue as changed; returns the new version.
+
+    Call it in the transaction that changes the queue: the counter row
+    stays locked until the commit, so versions follow commit order.
+    """
+    TokenCounter.query.filter_by(name="queue").update(
+        {TokenCounter.value: TokenCounter.value + 1}, synchronize_session=False
+    )
+    return current_queue_version()
+
+
+def current_queue_version():
+    return db.session.query(TokenCounter.value).filter_by(name="queue").scalar()
+
+
+queue_index = QueueIndex()
+
+
+# ---------------- SERVICE TIMES ---------------- #
+
+SERVICE_TIME_HISTORY = 200
+
+
+def load_desk_departures():
+    rows = db.session.query(
+        TokenBooking.fee_status, TokenBooking.booked_at, TokenBooking.sent_to_chanakya_at
+    ).filter(TokenBooking.sent_to_chanakya_at.isnot(None)).order_by(
+        TokenBooking.sent_to_chanakya_at.desc()
+    ).limit(SERVICE_TIME_HISTORY).all()
+    return [(queue_type_code(fee_status), booked_at, sent_at) for fee_status, booked_at, sent_at in rows]
+
+
+# The fixed 3/6 minute figures only seed the averages until real departures arrive.
+service_times = ServiceTimeEstimator(
+    {"X": QUICK_REVIEW_MINUTES * 60, "Y": DETAILED_REVIEW_MINUTES * 60},
+    loader=load_desk_departures,
+)
+
+
+# ---------------- QUEUE EVENTS ---------------- #
+
+# Each open /queue/stream holds a server thread; with it off, pages poll /queue/status instead.
+QUEUE_STREAM_ENABLED = os.environ.get("QUEUE_STREAM_ENABLED", "1").lower() in ("1", "true", "yes")
+# Student streams per worker process, so status tabs cannot take every thread
+# from logins and bookings; refused tabs poll. Admin streams are not counted.
+QUEUE_STREAM_LIMIT = int(os.environ.get("QUEUE_STREAM_LIMIT", WORKER_THREADS // 2))
+QUEUE_EVENT_POLL_SECONDS = float(os.environ.get("QUEUE_EVENT_POLL_SECONDS", 1.0))
+QUEUE_EVENT_RETENTION = timedelta(hours=1)
+QUEUE_EVENT_PRUNE_SECONDS = 10 * 60
+
+
+class QueueEventBroker:
+    """Fans queue mutations out to the /queue/stream subscribers.
+
+    Changes are written to the queue_event table by whichever worker made
+    them. Each process runs one relay thread that polls the table while it
+    has subscribers and hands new rows to them, so every tab sees every
+    change whichever worker it is connected to.
+
+    At most `limit` non-admin subscribers are admitted per process; each
+    holds a server thread, so the rest are refused and fall back to polling.
+    There are only a few desks, so admin subscribers are always admitted.
+
+    Every subscriber gets a bounded queue. A subscriber that falls too far
+    behind is sent a single "resync" event and dropped, so one stalled
+    browser tab can never grow memory without bound. Admin subscribers also
+    receive the booking view needed to draw a new card; students only see
+    token numbers.
+    """
+
+    MAX_BACKLOG = 256
+    KEEPALIVE_SECONDS = 15
+    POLL_BATCH_SIZE = 500
+
+    def __init__(self, interval, limit):
+        self._interval = interval
+        self._limit = limit
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._pid = None
+        self._last_id = None
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._subscribers = {}
+                self._last_id = None
+                threading.Thread(target=self._run, name="queue-events", daemon=True).start()
+                self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            time.sleep(self._interval)
+            try:
+                with app.app_context():
+                    self._relay()
+            except Exception:
+                app.logger.exception("Could not relay queue events")
+
+    def _relay(self):
+        with self._lock:
+            idle = not self._subscribers
+        if idle:
+            # Nobody to tell; start from the newest event once someone subscribes.
+            self._last_id = None
+            return
+        if self._last_id is None:
+            self._last_id = db.session.query(db.func.max(QueueEvent.id)).scalar() or 0
+            return
+        rows = QueueEvent.query.filter(QueueEvent.id > self._last_id).order_by(QueueEvent.id.asc()) \
+            .limit(self.POLL_BATCH_SIZE).all()
+        for row in rows:
+            self.publish(row.id, row.event, json.loads(row.public), json.loads(row.private) if row.private else None)
+            self._last_id = row.id
+
+    def subscribe(self, include_private):
+        """Return a new subscriber queue, or None if this process has no stream to spare."""
+        self._ensure_started()
+        subscriber = Queue(maxsize=self.MAX_BACKLOG)
+        with self._lock:
+            if not include_private:
+                public = sum(1 for private in self._subscribers.values() if not private)
+                if public >= self._limit:
+                    return None
+            self._subscribers[subscriber] = include_private
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.pop(subscriber, None)
+
+    def publish(self, event_id, event, public, private=None):
+        with self._lock:
+            subscribers = list(self._subscribers.items())
+        public_message = (event_id, event, public)
+        private_message = (event_id, event, {**public, **(private or {})})
+        for subscriber, include_private in subscribers:
+            try:
+                subscriber.put_nowait(private_message if include_private else public_message)
+            except Full:
+                self.unsubscribe(subscriber)
+                # Make room for the resync marker; the client reloads on it.
+                try:
+                    subscriber.get_nowait()
+                    subscriber.put_nowait((event_id, "resync", {}))
+                except (Empty, Full):
+                    pass
+
+    def stream(self, subscriber):
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event_id, event, data = subscriber.get(timeout=self.KEEPALIVE_SECONDS)
+                except Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+                if event == "resync":
+                    return
+        finally:
+            self.unsubscribe(subscriber)
+
+
+queue_events = QueueEventBroker(QUEUE_EVENT_POLL_SECONDS, QUEUE_STREAM_LIMIT)
+
+
+def queue_type_code(fee_status):
+    return "X" if (fee_status or "").lower() == "yes" else "Y"
+
+
+def prune_queue_events():
+    """Delete relayed events older than QUEUE_EVENT_RETENTION; returns how many went."""
+    pruned = QueueEvent.query.filter(
+        QueueEvent.created_at < datetime.now() - QUEUE_EVENT_RETENTION
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return pruned
+
+
+def publish_queue_event(event, booking, view=None):
+    if not QUEUE_STREAM_ENABLED:
+        return  # nobody can be listening, so skip the extra commit
+    status = queue_index.status_for(None)
+    public = {
+        "booking_id": booking.id,
+        "token_id": booking.token_id,
+        "queue": queue_type_code(booking.fee_status),
+        "sent_to_chanakya": bool(booking.sent_to_chanakya),
+        "now_serving_token": status["now_serving_token"],
+        "upcoming_tokens": status["upcoming_tokens"],
     }
-    for column, ddl_type in required_columns.items():
-        if column not in existing:
-            db.session.execute(text(f"ALTER TABLE token_booking ADD COLUMN {column} {ddl_type}"))
+    db.session.add(QueueEvent(
+        event=event,
+        public=json.dumps(public),
+        private=json.dumps({"booking": view}) if view else None,
+        created_at=datetime.now(),
+    ))
     db.session.commit()
 
 
+# ---------------- COUNTERS ---------------- #
+
+COUNTER_CLAIM_ATTEMPTS = 5
+
+lane_policy = make_policy(
+    LANE_POLICY,
+    weights=parse_weights(LANE_WEIGHTS),
+    mean_seconds=lambda lane: service_times.mean_minutes(lane) * 60,
+    max_wait_seconds=LANE_MAX_WAIT_MINUTES * 60,
+)
+lane_policy_lock = threading.Lock()  # the weighted policy keeps per-lane credit
+
+
+def verification_lane_head(lane):
+    return db.session.query(TokenBooking.id, TokenBooking.booked_at).filter_by(
+        fee_status=QUEUE_FEE_STATUS[lane], sent_to_chanakya=False, desk_counter=None
+    ).order_by(TokenBooking.id.asc()).limit(1)
+
+
+def chanakya_hall_head():
+    return db.session.query(TokenBooking.id).filter_by(sent_to_chanakya=True, chanakya_counter=None).filter(
+        TokenBooking.final_registration_completed.isnot(True)
+    ).order_by(TokenBooking.sent_to_chanakya_at.asc(), TokenBooking.id.asc()).limit(1)
+
+
+def current_booking_at(hall, counter):
+    if hall == "verification":
+        query = TokenBooking.query.filter_by(desk_counter=counter, sent_to_chanakya=False)
+    else:
+        query = TokenBooking.query.filter(
+            TokenBooking.chanakya_counter == counter, TokenBooking.final_registration_completed.isnot(True)
+        )
+    return query.order_by(TokenBooking.id.asc()).first()
+
+
+def claim_for_counter(booking_id, column, counter):
+    # Conditional update: two counters racing for one student cannot both win.
+    claimed = TokenBooking.query.filter(TokenBooking.id == booking_id, column.is_(None)).update(
+        {column: counter}, synchronize_session=False
+    )
+    return claimed == 1
+
+
+def pick_next(hall):
+    """Return the id of the booking the hall should call next, or None."""
+    if hall == "chanakya":
+        row = chanakya_hall_head().first()
+        return row.id if row else None
+    heads, ids = {}, {}
+    for lane in QUEUE_FEE_STATUS:
+        row = verification_lane_head(lane).first()
+        if row:
+            ids[lane] = row.id
+            heads[lane] = row.booked_at.timestamp() if row.booked_at else 0
+    with lane_policy_lock:
+        lane = lane_policy.choose(heads, time.time())
+    return ids[lane] if lane else None
+
+
+def call_next(hall, counter):
+    """Assign the next waiting student to a counter.
+
+    A counter that is still serving someone gets that booking back, so a
+    repeated "call next" never skips a student.
+    """
+    current = current_booking_at(hall, counter)
+    if current:
+        return current
+    column = TokenBooking.desk_counter if hall == "verification" else TokenBooking.chanakya_counter
+    for _ in range(COUNTER_CLAIM_ATTEMPTS):
+        booking_id = pick_next(hall)
+        if booking_id is None:
+            return None
+        if claim_for_counter(booking_id, column, counter):
+            db.session.commit()
+            return TokenBooking.query.get(booking_id)
+        db.session.rollback()
+    return None
+
+
+@app.route("/counters")
+def counters_status():
+    if not session.get("admin_email"):
+        return jsonify({"success": False, "message": "Admin login required."}), 401
+    halls = {}
+    for hall, counters in HALL_COUNTERS.items():
+        halls[hall] = []
+        for counter in counters:
+            current = current_booking_at(hall, counter)
+            halls[hall].append({
+                "counter": counter,
+                "booking_id": current.id if current else None,
+                "token_id": current.token_id if current else None,
+                "queue": queue_type_code(current.fee_status) if current else None,
+            })
+    return jsonify({"success": True, "lane_policy": lane_policy.name, "halls": halls})
+
+
+@app.route("/counters/<hall>/<counter>/call-next", methods=["POST"])
+def call_next_counter(hall, counter):
+    if not session.get("admin_email"):
+        return jsonify({"success": False, "message": "Admin login required."}), 401
+    if counter not in HALL_COUNTERS.get(hall, ()):
+        return jsonify({"success": False, "message": "Unknown counter."}), 404
+    booking = call_next(hall, counter)
+    if booking is None:
+        return jsonify({"success": True, "booking": None, "message": "Nobody is waiting."})
+    view = booking_to_view(booking)
+    publish_queue_event("booking-called", booking, view)
+    audit("booking-called", booking, counter=counter)
+    return jsonify({"success": True, "booking": view})
+
+
+# ---------------- AUDIT LOG ---------------- #
+
+AUDIT_BATCH_SIZE = 200
+AUDIT_FLUSH_SECONDS = 1.0
+
+
+def write_audit_batch(rows):
+    with app.app_context():
+        db.session.execute(AuditEvent.__table__.insert(), rows)
+        db.session.commit()
+
+
+audit_log = BatchWriter(
+    write_audit_batch, batch_size=AUDIT_BATCH_SIZE, interval=AUDIT_FLUSH_SECONDS, logger=app.logger
+)
+
+
+def audit(event, booking, counter=None, **detail):
+    """Queue an audit record; it is written in the background within about a second."""
+    audit_log.submit({
+        "event": event,
+        "booking_id": booking.id,
+        "token_id": booking.token_id,
+        "student_email": booking.student_email,
+        "queue": queue_type_code(booking.fee_status),
+        "slot_time": booking.slot_time,
+        "actor": session.get("admin_email") or session.get("student_email"),
+        "counter": counter,
+        "detail": json.dumps(detail) if detail else None,
+        "created_at": datetime.now(),
+    })
+
+
+@app.cli.command("replay-audit")
+@click.option("--check/--no-check", default=True, help="Compare the rebuilt queue with the bookings table.")
+def replay_audit_command(check):
+    """Rebuild queue state and desk throughput from the audit log."""
+    rows = db.session.query(
+        AuditEvent.event, AuditEvent.booking_id, AuditEvent.queue, AuditEvent.actor,
+        AuditEvent.counter, AuditEvent.created_at,
+    ).order_by(AuditEvent.id.asc()).execution_options(yield_per=1000)
+    state = replay(rows)
+    waiting = state["waiting"]
+    click.echo(f"waiting:   {len(waiting)} (X {sum(q == 'X' for q in waiting.values())}, "
+               f"Y {sum(q == 'Y' for q in waiting.values())})")
+    click.echo(f"in hall:   {len(state['in_hall'])}")
+    click.echo(f"completed: {len(state['completed'])}")
+    click.echo(f"rejected:  {len(state['rejected'])}")
+    for (actor, counter), desk in sorted(state["throughput"].items(), key=lambda item: str(item[0])):
+        gap = f"{desk['mean_gap_seconds'] / 60:.1f} min" if desk["mean_gap_seconds"] is not None else "--"
+        rate = f"{desk['per_hour']:.1f}/h" if desk["per_hour"] is not None else "--"
+        click.echo(f"desk {counter or '-'} ({actor or 'unknown'}): {desk['approved']} approved, "
+                   f"mean gap {gap}, {rate}")
+    if not check:
+        return
+    # Bookings made before the audit log existed have no booking-created event.
+    first_logged = db.session.query(db.func.min(AuditEvent.booking_id)).filter(
+        AuditEvent.event == "booking-created"
+    ).scalar()
+    if first_logged is None:
+        click.echo("No booking-created events yet; nothing to check.")
+        return
+    live = {booking_id for (booking_id,) in db.session.query(TokenBooking.id).filter_by(sent_to_chanakya=False)
+            .filter(TokenBooking.id >= first_logged)}
+    mismatched = live.symmetric_difference(waiting)
+    if mismatched:
+        raise click.ClickException(f"Waiting queue differs from the bookings table for ids {sorted(mismatched)[:20]}.")
+    click.echo(f"Waiting queue matches the bookings table (ids >= {first_logged}).")
+
+
+# ---------------- UPLOAD SWEEPER ---------------- #
+
+UPLOAD_SWEEP_BATCH_SIZE = 100
+UPLOAD_SWEEP_SECONDS = float(os.environ.get("UPLOAD_SWEEP_SECONDS", 60))
+ORPHAN_SCAN_SECONDS = float(os.environ.get("ORPHAN_SCAN_SECONDS", 60 * 60))
+# Uploads are written before their booking commits, so younger files may be unreferenced for a moment.
+ORPHAN_GRACE_SECONDS = float(os.environ.get("ORPHAN_GRACE_SECONDS", 60 * 60))
+# A freed document touched more recently than this may have just been
+# uploaded again for a booking that has not committed yet; it is left
+# for the orphan sweep.
+DOCUMENT_REUSE_SECONDS = 10 * 60
+BOOKING_DOC_COLUMNS = (
+    TokenBooking.class10_doc, TokenBooking.class12_doc, TokenBooking.category_doc, TokenBooking.paid_receipt_doc,
+)
+
+
+def remove_upload(doc_name, dry_run=False):
+    """Delete one stored document and its thumbnail; returns the bytes freed."""
+    path = os.path.join(UPLOAD_DIR, doc_name)
+    try:
+        size = os.path.getsize(path)
+        if not dry_run:
+            os.remove(path)
+    except FileNotFoundError:
+        size = 0
+    if not dry_run:
+        size += thumbnails.discard(doc_name)
+    return size
+
+
+def sweep_rejected_documents(dry_run=False):
+    """Release the documents of rejected bookings in batches; returns the bytes freed.
+
+    The rejected rows themselves are the queue: a row leaves it once its
+    documents_swept_at is set, in the same commit that drops its document
+    references. Files are deleted only after that commit and only when no
+    other booking still refers to them.
+    """
+    reclaimed = 0
+    last_id = 0
+    while True:
+        batch = TokenBooking.query.filter(
+            TokenBooking.rejected_at.isnot(None),
+            TokenBooking.documents_swept_at.is_(None),
+            TokenBooking.id > last_id,
+        ).order_by(TokenBooking.id.asc()).limit(UPLOAD_SWEEP_BATCH_SIZE).execution_options(
+            include_rejected=True
+        ).all()
+        if not batch:
+            break
+        swept_at = datetime.now()
+        doc_names = []
+        for booking in batch:
+            # Each worker runs a sweeper; only the one whose UPDATE claims the row releases it.
+            claimed = TokenBooking.query.filter(
+                TokenBooking.id == booking.id, TokenBooking.documents_swept_at.is_(None)
+            ).execution_options(include_rejected=True).update(
+                {TokenBooking.documents_swept_at: swept_at}, synchronize_session=False
+            )
+            if claimed:
+                doc_names.extend(getattr(booking, column.key) for column in BOOKING_DOC_COLUMNS)
+        unused = release_documents(doc_names)
+        last_id = batch[-1].id
+        if dry_run:
+            db.session.rollback()
+        else:
+            db.session.commit()
+        reuse_cutoff = time.time() - DOCUMENT_REUSE_SECONDS
+        for doc_name in unused:
+            try:
+                if os.path.getmtime(os.path.join(UPLOAD_DIR, doc_name)) < reuse_cutoff:
+                    reclaimed += remove_upload(doc_name, dry_run)
+            except FileNotFoundError:
+                continue
+    return reclaimed
+
+
+def remove_orphaned_uploads(grace_seconds=ORPHAN_GRACE_SECONDS, dry_run=False):
+    """Delete files in UPLOAD_DIR that no live or archived booking refers to; returns the bytes freed."""
+    referenced = set()
+    for model in (TokenBooking, ArchivedBooking):
+        rows = db.session.query(*(getattr(model, column.key) for column in BOOKING_DOC_COLUMNS)) \
+            .filter(model.documents_swept_at.is_(None)).execution_options(include_rejected=True, yield_per=1000)
+        for row in rows:
+            referenced.update(row)
+    cutoff = time.time() - grace_seconds
+    reclaimed = 0
+    for entry in os.scandir(UPLOAD_DIR):
+        if not entry.is_file() or entry.name in referenced or entry.stat().st_mtime > cutoff:
+            continue
+        reclaimed += remove_upload(entry.name, dry_run)
+    return reclaimed
+
+
+class UploadSweeper:
+    """Background thread that runs the two sweeps above.
+
+    Rejected documents are swept when `wake` is called and every
+    `interval` seconds; orphans are looked for every `orphan_interval`.
+    Like the audit writer, the thread is started once per process. It
+    also prunes old queue events, which must happen whether or not
+    anyone is subscribed to the stream.
+    """
+
+    def __init__(self, interval, orphan_interval):
+        self._interval = interval
+        self._orphan_interval = orphan_interval
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def start(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                threading.Thread(target=self._run, name="upload-sweeper", daemon=True).start()
+                self._pid = os.getpid()
+
+    def wake(self):
+        self.start()
+        self._wakeup.set()
+
+    def _sweep(self, source, sweep):
+        with app.app_context():
+            try:
+                reclaimed = sweep()
+            except Exception:
+                db.session.rollback()
+                app.logger.exception("Upload sweep (%s) failed", source)
+                return
+        if reclaimed:
+            app.logger.info("Upload sweep (%s) reclaimed %d bytes", source, reclaimed)
+            if metrics is not None:
+                metrics.increment("nitc_upload_reclaimed_bytes_total", reclaimed, source=source)
+
+    def _prune_queue_events(self):
+        with app.app_context():
+            try:
+                prune_queue_events()
+            except Exception:
+                db.session.rollback()
+                app.logger.exception("Could not prune queue events")
+
+    def _run(self):
+        next_orphan_scan = time.monotonic() + self._orphan_interval
+        next_event_prune = time.monotonic()
+        while True:
+            self._wakeup.wait(self._interval)
+            self._wakeup.clear()
+            self._sweep("rejected", sweep_rejected_documents)
+            if time.monotonic() >= next_orphan_scan:
+                self._sweep("orphaned", remove_orphaned_uploads)
+                next_orphan_scan = time.monotonic() + self._orphan_interval
+            if time.monotonic() >= next_event_prune:
+                self._prune_queue_events()
+                next_event_prune = time.monotonic() + QUEUE_EVENT_PRUNE_SECONDS
+
+
+upload_sweeper = UploadSweeper(UPLOAD_SWEEP_SECONDS, ORPHAN_SCAN_SECONDS)
+# Started by the first request each worker serves, so CLI commands never spawn it.
+app.before_request(upload_sweeper.start)
+
+
+@app.cli.command("sweep-uploads")
+@click.option("--grace", type=float, default=ORPHAN_GRACE_SECONDS, show_default=True,
+              help="Keep unreferenced files younger than this many seconds.")
+@click.option("--dry-run", is_flag=True, help="Report what would be removed without deleting anything.")
+def sweep_uploads_command(grace, dry_run):
+    """Remove documents of rejected bookings and orphaned uploads."""
+    rejected = sweep_rejected_documents(dry_run)
+    orphaned = remove_orphaned_uploads(grace, dry_run)
+    verb = "Would reclaim" if dry_run else "Reclaimed"
+    click.echo(f"{verb} {rejected} bytes from rejected bookings and {orphaned} bytes of orphaned uploads.")
+
+
+# ---------------- METRICS ---------------- #
+
+metrics = None
+
+
+def _start_request_metrics():
+    metrics.start()
+    g.metrics_started = time.perf_counter()
+    g.metrics_queries = 0
+    g.metrics_query_seconds = 0.0
+
+
+def _note_response_status(response):
+    g.metrics_status = response.status_code
+    return response
+
+
+def _finish_request_metrics(exc):
+    # A teardown hook, so requests that end in an unhandled exception are counted too.
+    started = g.pop("metrics_started", None)
+    if started is None:
+        return
+    status = 500 if exc is not None else g.pop("metrics_status", 500)
+    endpoint = request.endpoint or "unmatched"
+    metrics.observe("nitc_request_seconds", time.perf_counter() - started, endpoint=endpoint, method=request.method)
+    metrics.increment("nitc_requests_total", endpoint=endpoint, method=request.method, status=status)
+    metrics.observe("nitc_request_queries", g.metrics_queries, endpoint=endpoint)
+    metrics.increment("nitc_query_seconds_total", g.metrics_query_seconds, endpoint=endpoint)
+
+
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_query_started", []).append(time.perf_counter())
+
+
+def _abandon_query_timer(exception_context):
+    # after_cursor_execute never runs for a statement that raised.
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("metrics_query_started"):
+        connection.info["metrics_query_started"].pop()
+
+
+def _finish_query_timer(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["metrics_query_started"].pop()
+    endpoint = "background"
+    if has_request_context():
+        endpoint = request.endpoint or "unmatched"
+        if "metrics_queries" in g:
+            g.metrics_queries += 1
+            g.metrics_query_seconds += elapsed
+    if elapsed >= SLOW_QUERY_SECONDS:
+        metrics.increment("nitc_slow_queries_total", endpoint=endpoint)
+        metrics.record_slow_query(statement, elapsed, endpoint)
+
+
+def _start_template_timer(sender, template, context, **extra):
+    if has_request_context():
+        g.metrics_template_started = time.perf_counter()
+
+
+def _finish_template_timer(sender, template, context, **extra):
+    started = g.pop("metrics_template_started", None) if has_request_context() else None
+    if started is not None:
+        metrics.observe("nitc_template_render_seconds", time.perf_counter() - started, template=template.name)
+
+
+def install_metrics():
+    """Create the registry and hook Flask, SQLAlchemy and Jinja signals into it."""
+    global metrics
+    metrics = MetricsRegistry(directory=METRICS_DIR)
+    metrics.histogram("nitc_request_seconds", "Time spent handling a request, by endpoint.")
+    metrics.counter("nitc_requests_total", "Requests handled, by endpoint and status code.")
+    metrics.histogram("nitc_request_queries", "SQL statements issued per request.", buckets=COUNT_BUCKETS)
+    metrics.counter("nitc_query_seconds_total", "Time spent executing SQL, by endpoint.")
+    metrics.counter("nitc_slow_queries_total", f"SQL statements slower than {SLOW_QUERY_SECONDS}s.")
+    metrics.histogram("nitc_template_render_seconds", "Time spent rendering a template.")
+    metrics.histogram("nitc_upload_write_seconds", "Time spent streaming one document to disk.")
+    metrics.counter("nitc_upload_bytes_total", "Document bytes written to disk.")
+    metrics.counter("nitc_upload_reclaimed_bytes_total", "Upload and thumbnail bytes removed by the sweeper, by source.")
+    app.before_request(_start_request_metrics)
+    app.after_request(_note_response_status)
+    app.teardown_request(_finish_request_metrics)
+    event.listen(Engine, "before_cursor_execute", _start_query_timer)
+    event.listen(Engine, "after_cursor_execute", _finish_query_timer)
+    event.listen(Engine, "handle_error", _abandon_query_timer)
+    before_render_template.connect(_start_template_timer, app)
+    template_rendered.connect(_finish_template_timer, app)
+
+
+def metrics_gauges():
+    depth = queue_index.depth()
+    slots = db.session.query(Slot.time, Slot.capacity).all()
+    return [
+        ("nitc_queue_waiting", "Bookings waiting for the verification desk, by queue.",
+         {(("queue", queue),): count for queue, count in depth.items()}),
+        ("nitc_slot_capacity_remaining", "Capacity units left in each slot.",
+         {(("slot", slot_time),): capacity for slot_time, capacity in slots}),
+    ]
+
+
+if METRICS_ENABLED:
+    install_metrics()
+
+
+@app.route("/metrics")
+def metrics_page():
+    if metrics is None:
+        abort(404)
+    return Response(metrics.render(metrics_gauges()), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/metrics/slow-queries")
+def slow_queries_page():
+    if metrics is None:
+        abort(404)
+    if not session.get("admin_email"):
+        return jsonify({"success": False, "message": "Admin login required."}), 401
+    return jsonify({"success": True, "threshold_seconds": SLOW_QUERY_SECONDS, "samples": metrics.slow_query_samples()})
+
+
+# ---------------- STATIC ASSETS ---------------- #
+
+# Built by `flask build-assets`; until then templates fall back to /static.
+ASSET_DIR = os.path.join(app.static_folder, "dist")
+assets = asset_pipeline.AssetManifest(ASSET_DIR)
+ASSET_ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+
+@app.template_global()
+def asset_url(filename):
+    """URL for a file in static/, fingerprinted once the assets have been built."""
+    fingerprinted = assets.lookup(filename)
+    if fingerprinted is None:
+        return url_for("static", filename=filename)
+    return url_for("fingerprinted_asset", filename=fingerprinted)
+
+
+@app.route("/assets/<path:filename>")
+def fingerprinted_asset(filename):
+    available = assets.encodings(filename)
+    if not available:
+        abort(404)
+    encoding = request.accept_encodings.best_match([e for e in ASSET_ENCODING_SUFFIXES if e in available])
+    response = send_from_directory(
+        ASSET_DIR,
+        filename + ASSET_ENCODING_SUFFIXES.get(encoding, ""),
+        mimetype=mimetypes.guess_type(filename)[0] or "application/octet-stream",
+        max_age=DOCUMENT_MAX_AGE,
+    )
+    if encoding:
+        response.content_encoding = encoding
+    response.vary.add("Accept-Encoding")
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+@app.cli.command("build-assets")
+@click.option("--keep", type=int, default=asset_pipeline.KEEP_BUILDS, show_default=True,
+              help="Builds whose files stay servable, the new one included.")
+def build_assets_command(keep):
+    """Fingerprint and precompress static/ into static/dist."""
+    built = asset_pipeline.build(app.static_folder, ASSET_DIR, keep_builds=keep)
+    totals = {"identity": 0, "gzip": 0, "br": 0}
+    for name, (fingerprinted, sizes) in sorted(built.items()):
+        for encoding in totals:
+            totals[encoding] += sizes.get(encoding, sizes["identity"])
+        compressed = ", ".join(f"{encoding} {size}" for encoding, size in sizes.items() if encoding != "identity")
+        click.echo(f"{fingerprinted}: {sizes['identity']} bytes" + (f" ({compressed})" if compressed else ""))
+    brotli_total = f"brotli {totals['br']}" if asset_pipeline.brotli else "no brotli (install it for .br copies)"
+    click.echo(f"{len(built)} files, {totals['identity']} bytes; gzip {totals['gzip']}, {brotli_total}")
+
 
 # ---------------- PAGE ROUTES ---------------- #
 
@@ -156,7 +1960,7 @@ def student_page():
     email = session.get("student_email")
     existing_booking = None
     if email:
-        current = TokenBooking.query.filter_by(student_email=email).order_by(TokenBooking.id.desc()).first()
+        current = latest_booking_for(email)
         if current:
             existing_booking = booking_to_view(current)
     final_admission_slip_url = None
@@ -172,49 +1976,99 @@ def student_page():
 
 @app.route("/admin.html")
 def admin_page():
-    bookings = TokenBooking.query.order_by(TokenBooking.id.desc()).all()
-    quick_bookings = [booking_to_view(b) for b in bookings if (b.fee_status or "").lower() == "yes"]
-    detailed_bookings = [booking_to_view(b) for b in bookings if (b.fee_status or "").lower() == "no"]
+    quick_bookings, quick_cursor = booking_page(fee_status="yes")
+    detailed_bookings, detailed_cursor = booking_page(fee_status="no")
     return render_template(
         "admin.html",
         quick_bookings=quick_bookings,
-        detailed_bookings=detailed_bookings
+        detailed_bookings=detailed_bookings,
+        quick_total=count_bookings(fee_status="yes"),
+        detailed_total=count_bookings(fee_status="no"),
+        quick_cursor=quick_cursor,
+        detailed_cursor=detailed_cursor,
     )
 
 @app.route("/book-token.html")
 def book_token_page():
     email = session.get("student_email")
-    slots = Slot.query.order_by(Slot.id.asc()).all()
-    slot_data = [{"time": s.time, "capacity": s.capacity} for s in slots]
+    slot_data, slots_etag = slot_availability.snapshot()
     existing_booking = None
     if email:
-        current = TokenBooking.query.filter_by(student_email=email).order_by(TokenBooking.id.desc()).first()
+        current = latest_booking_for(email)
         if current:
             existing_booking = booking_to_view(current)
-    return render_template("book-token.html", email=email, slots=slot_data, existing_booking=existing_booking)
+    return render_template(
+        "book-token.html",
+        email=email,
+        slots=slot_data,
+        slots_etag=f'"{slots_etag}"',
+        existing_booking=existing_booking,
+    )
+
+
+@app.route("/api/slots")
+def slots_api():
+    slot_data, slots_etag = slot_availability.snapshot()
+    response = jsonify({"success": True, "slots": slot_data})
+    response.set_etag(slots_etag)
+    # Revalidate every time; an unchanged ETag costs a 304 with no body.
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
 @app.route("/lateadmin.html")
 def lateadmin_page():
     return render_template("lateadmin.html")
 
 @app.route("/admin2.html")
 def admin2_page():
-    chanakya_queue = TokenBooking.query.filter_by(sent_to_chanakya=True).order_by(TokenBooking.id.asc()).all()
-    chanakya_bookings = [booking_to_view(b) for b in chanakya_queue]
+    chanakya_bookings, chanakya_cursor = booking_page(descending=False, sent_to_chanakya=True)
     selected_booking_id = request.args.get("booking", type=int)
-    active_booking = None
-    if chanakya_bookings:
-        active_booking = chanakya_bookings[0]
-        if selected_booking_id is not None:
-            for booking in chanakya_bookings:
-                if booking["id"] == selected_booking_id:
-                    active_booking = booking
-                    break
-    return render_template("admin2.html", chanakya_bookings=chanakya_bookings, active_booking=active_booking)
+    active = None
+    if selected_booking_id is not None:
+        active = TokenBooking.query.filter_by(id=selected_booking_id, sent_to_chanakya=True).first()
+    if active is None:
+        active = TokenBooking.query.filter_by(sent_to_chanakya=True).order_by(TokenBooking.id.asc()).first()
+    return render_template(
+        "admin2.html",
+        chanakya_bookings=chanakya_bookings,
+        chanakya_total=count_bookings(sent_to_chanakya=True),
+        chanakya_cursor=chanakya_cursor,
+        active_booking=booking_to_view(active) if active else None,
+    )
+
+
+@app.route("/api/bookings")
+def bookings_api():
+    if not session.get("admin_email"):
+        return jsonify({"success": False, "message": "Admin login required."}), 401
+
+    queue = (request.args.get("queue") or "").upper()
+    fee = (request.args.get("fee") or "").lower()
+    if queue and queue not in QUEUE_FEE_STATUS:
+        return jsonify({"success": False, "message": "queue must be X or Y."}), 400
+    if fee and fee not in ("yes", "no"):
+        return jsonify({"success": False, "message": "fee must be yes or no."}), 400
+    if queue and fee and QUEUE_FEE_STATUS[queue] != fee:
+        return jsonify({"success": True, "bookings": [], "next_cursor": None})
+
+    chanakya = (request.args.get("sent_to_chanakya") or "").lower()
+    if chanakya and chanakya not in ("true", "false", "1", "0"):
+        return jsonify({"success": False, "message": "sent_to_chanakya must be true or false."}), 400
+
+    limit = max(1, min(request.args.get("limit", BOOKING_PAGE_SIZE, type=int), BOOKING_PAGE_MAX))
+    bookings, next_cursor = booking_page(
+        after=request.args.get("after", type=int),
+        limit=limit,
+        descending=(request.args.get("order") or "desc").lower() != "asc",
+        fee_status=QUEUE_FEE_STATUS.get(queue) or fee or None,
+        slot_time=request.args.get("slot") or None,
+        sent_to_chanakya=(chanakya in ("true", "1")) if chanakya else None,
+    )
+    return jsonify({"success": True, "bookings": bookings, "next_cursor": next_cursor})
 
 
 @app.route("/final-registration-print/<int:booking_id>")
 def final_registration_print_page(booking_id):
-    booking = TokenBooking.query.get(booking_id)
+    booking = find_booking(booking_id)
     if not booking:
         return abort(404)
 
@@ -231,6 +2085,8 @@ def final_registration_print_page(booking_id):
         booking=booking_to_view(booking),
         generated_at=booking.final_registration_completed_at or datetime.now().strftime("%d %b %Y, %I:%M %p"),
         generated_by=admin_email or "Admissions Office",
+        slip_url=url_for("final_registration_slip", booking_id=booking.id)
+        if weasyprint is not None and booking.final_registration_completed else None,
     )
 
 
@@ -250,8 +2106,12 @@ def complete_final_registration():
 
     booking.final_registration_completed = True
     if not booking.final_registration_completed_at:
-        booking.final_registration_completed_at = datetime.now().strftime("%d %b %Y, %I:%M %p")
+        booking.registration_completed_at = datetime.now()
+        booking.final_registration_completed_at = booking.registration_completed_at.strftime("%d %b %Y, %I:%M %p")
     db.session.commit()
+    publish_queue_event("registration-completed", booking)
+    audit("registration-completed", booking, counter=booking.chanakya_counter)
+    schedule_slip(booking.id)
 
     return jsonify({
         "success": True,
@@ -260,50 +2120,95 @@ def complete_final_registration():
     })
 
 
+def live_status(email):
+    status = queue_index.status_for(email)
+    x_count = status["x_count"]
+    y_count = status["y_count"]
+    return {
+        "now_serving_token": status["now_serving_token"],
+        "student_token": status["student_token"],
+        "upcoming_tokens": status["upcoming_tokens"],
+        "x_count": x_count,
+        "y_count": y_count,
+        "students_ahead": x_count + y_count,
+        "expected_time_minutes": service_times.expected_minutes({"X": x_count, "Y": y_count}),
+        "booking_id": status["booking_id"],
+    }
+
+
 @app.route("/livestatus.html")
 def livestatus_page():
     email = session.get("student_email")
-    queue = TokenBooking.query.filter_by(sent_to_chanakya=False).order_by(TokenBooking.id.asc()).all()
-
-    now_serving = queue[0] if queue else None
-    upcoming_tokens = [b.token_id for b in queue[1:6] if b.token_id]
-    current_booking = None
-    for booking in queue:
-        if booking.student_email == email:
-            current_booking = booking
-            break
-
-    x_count = 0
-    y_count = 0
-    student_token = current_booking.token_id if current_booking else "--"
-
-    if current_booking:
-        ahead = [b for b in queue if b.id < current_booking.id]
-        x_count = sum(1 for b in ahead if (b.fee_status or "").lower() == "yes")
-        y_count = sum(1 for b in ahead if (b.fee_status or "").lower() != "yes")
-
-    students_ahead = x_count + y_count
-    expected_time_minutes = (3 * x_count) + (6 * y_count)
-
     return render_template(
         "livestatus.html",
         email=email,
-        now_serving_token=now_serving.token_id if now_serving and now_serving.token_id else "--",
-        student_token=student_token,
-        upcoming_tokens=upcoming_tokens,
-        x_count=x_count,
-        y_count=y_count,
-        students_ahead=students_ahead,
-        expected_time_minutes=expected_time_minutes,
+        **live_status(email),
+        quick_review_minutes=round(service_times.mean_minutes("X"), 2),
+        detailed_review_minutes=round(service_times.mean_minutes("Y"), 2),
         updated_label="Live",
     )
 
 
+@app.route("/queue/status")
+def queue_status():
+    """Polling fallback for pages that could not open /queue/stream."""
+    response = jsonify(live_status(session.get("student_email")))
+    response.cache_control.no_store = True
+    return response
+
+
+@app.route("/queue/stream")
+def queue_stream():
+    subscriber = None
+    if QUEUE_STREAM_ENABLED:
+        subscriber = queue_events.subscribe(include_private=bool(session.get("admin_email")))
+    if subscriber is None:
+        # EventSource gives up on a 204 instead of reconnecting; the page polls /queue/status.
+        return "", 204
+    response = Response(
+        queue_events.stream(subscriber),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    # Also free the slot if the client goes away before the stream starts.
+    response.call_on_close(lambda: queue_events.unsubscribe(subscriber))
+    return response
+
+def cache_privately(response):
+    # Documents are admin-only: browsers may keep them, shared caches may not.
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.immutable = True
+    return response
+
+
 @app.route("/uploads/<path:filename>")
 def uploaded_file(filename):
     if not session.get("admin_email"):
         abort(403)
-    return send_from_directory(UPLOAD_DIR, filename, as_attachment=False)
+    # send_from_directory answers If-None-Match / If-Modified-Since with 304
+    # and serves Range requests from the file on disk.
+    response = send_from_directory(UPLOAD_DIR, filename, as_attachment=False, max_age=DOCUMENT_MAX_AGE)
+    if not document_is_final(filename):
+        # Normalisation may still rewrite the file; revalidate until it has.
+        response.cache_control.max_age = None
+        response.cache_control.no_cache = True
+        response.cache_control.private = True
+        return response
+    return cache_privately(response)
+
+
+@app.route("/thumbnails/<path:filename>")
+def document_thumbnail(filename):
+    if not session.get("admin_email"):
+        abort(403)
+    if not os.path.isfile(os.path.join(UPLOAD_DIR, secure_filename(filename))):
+        abort(404)
+    thumbnail = thumbnails.get(secure_filename(filename))
+    if thumbnail is None:
+        return uploaded_file(filename)
+    response = send_from_directory(THUMBNAIL_DIR, thumbnail, max_age=DOCUMENT_MAX_AGE)
+    return cache_privately(response)
 
 # @app.route("/success-token.html")
 # def success_token():
@@ -320,6 +2225,7 @@ def set_40():
         s.capacity = 40
 
     db.session.commit()
+    slot_availability.refresh()
 
     return "All slots set to 40"
  
@@ -351,9 +2257,20 @@ def proceed_to_chanakya():
     if not booking:
         return jsonify({"success": False, "message": "Booking not found."}), 404
 
+    if booking.sent_to_chanakya:
+        return jsonify({"success": True, "message": "Student moved to Chanakya queue."})
+
+    now = datetime.now()
+    previous_departure = db.session.query(db.func.max(TokenBooking.sent_to_chanakya_at)).scalar()
     booking.sent_to_chanakya = True
+    booking.sent_to_chanakya_at = now
     booking.admin1_notes = admin1_notes
+    queue_version = bump_queue_version()
     db.session.commit()
+    service_times.record_departure(queue_type_code(booking.fee_status), booking.booked_at, previous_departure, now)
+    queue_index.remove(booking.id, queue_version)
+    publish_queue_event("booking-moved", booking, booking_to_view(booking))
+    audit("booking-approved", booking, counter=booking.desk_counter, notes=admin1_notes)
     return jsonify({"success": True, "message": "Student moved to Chanakya queue."})
 
 
@@ -371,42 +2288,134 @@ def reject_booking():
     if not booking:
         return jsonify({"success": False, "message": "Booking not found."}), 404
 
-    slot_obj = Slot.query.filter_by(time=booking.slot_time).first()
-    if slot_obj:
-        slot_obj.capacity += capacity_units_for_fee(booking.fee_status)
+    release_slot_capacity(booking.slot_time, capacity_units_for_fee(booking.fee_status))
 
-    for doc_name in [booking.class10_doc, booking.class12_doc, booking.category_doc, booking.paid_receipt_doc]:
-        if not doc_name:
-            continue
-        path = os.path.join(UPLOAD_DIR, doc_name)
-        if os.path.exists(path):
-            os.remove(path)
-
-    db.session.delete(booking)
+    # The row is kept, hidden from every query, until the sweeper has
+    # removed its documents; nothing touches the disk in this request.
+    booking.rejected_at = datetime.now()
+    queue_version = bump_queue_version()
     db.session.commit()
+    slot_availability.refresh()
+    queue_index.remove(booking.id, queue_version)
+    booking_projections.discard(booking.id)
+    publish_queue_event("booking-removed", booking)
+    audit("booking-rejected", booking, sent_to_chanakya=bool(booking.sent_to_chanakya))
+    upload_sweeper.wake()
     return jsonify({"success": True, "message": "Profile rejected and booking removed."})
 
 
 
 # ---------------- LOGIN API ---------------- #
 
+class LoginBusy(Exception):
+    pass
+
+
+def is_password_hash(value):
+    return bool(value) and value.startswith(PASSWORD_HASH_PREFIXES)
+
+
+def hash_password(password):
+    return generate_password_hash(password, method=PASSWORD_HASH_METHOD)
+
+
+def hash_passwords(passwords):
+    """Hash many passwords at once on the password pool (hashlib releases the GIL)."""
+    return list(password_workers.map(hash_password, passwords))
+
+
+def verify_password(stored_hash, password):
+    """Check a password on the password pool.
+
+    At most LOGIN_PENDING_MAX checks may be queued or running; beyond that
+    LoginBusy is raised instead of letting hash work pile up.
+    """
+    if not stored_hash:
+        return False
+    if not login_slots.acquire(blocking=False):
+        raise LoginBusy()
+    try:
+        return password_workers.submit(check_password_hash, stored_hash, password).result()
+    finally:
+        login_slots.release()
+
+
+class CredentialCache:
+    """Short-lived cache of (role, email) -> stored password hash.
+
+    Unknown emails are cached too (as None), so repeated attempts against
+    accounts that do not exist never reach the database. Emails are
+    stored in lower case, so lookups are case-insensitive.
+    """
+
+    def __init__(self, ttl, max_entries=20_000):
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._entries = OrderedDict()   # (role, email) -> (expires_at, password hash or None)
+        self._lock = threading.Lock()
+
+    def get(self, role, email):
+        email = email.lower()
+        key = (role, email)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                return entry[1]
+        model = Student if role == "student" else Admin
+        row = db.session.query(model.password).filter_by(email=email).first()
+        stored_hash = row[0] if row else None
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (now + self._ttl, stored_hash)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return stored_hash
+
+    def invalidate(self, role=None, email=None):
+        with self._lock:
+            if role is None:
+                self._entries.clear()
+            else:
+                self._entries.pop((role, email.lower()), None)
+
+
+credentials = CredentialCache(CREDENTIAL_CACHE_SECONDS)
+
+
+def too_many_logins(limiter):
+    response = jsonify({"success": False, "message": "Too many login attempts. Please wait and try again."})
+    response.headers["Retry-After"] = str(limiter.retry_after())
+    return response, 429
+
+
 @app.route("/login", methods=["POST"])
 def login():
 
     data = request.get_json()
 
     role = data.get("role")
-    email = data.get("email").strip()
+    # Accounts are stored in lower case (see lowercase_account_emails).
+    email = data.get("email").strip().lower()
     password = data.get("password").strip()
 
+    if role not in ("student", "admin"):
+        return jsonify({"success":False,"message":"Invalid role"})
+    # Refuse floods before any database or hashing work is done.
+    if not login_ip_limiter.allow(request.remote_addr):
+        return too_many_logins(login_ip_limiter)
+    if not login_email_limiter.allow((role, email)):
+        return too_many_logins(login_email_limiter)
+    try:
+        valid = verify_password(credentials.get(role, email), password)
+    except LoginBusy:
+        response = jsonify({"success": False, "message": "Login is busy right now. Please try again."})
+        response.headers["Retry-After"] = "1"
+        return response, 503
+
     # -------- STUDENT LOGIN -------- #
     if role == "student":
-        user = Student.query.filter_by(
-            email=email,
-            password=password
-        ).first()
-
-        if user:
+        if valid:
             session["student_email"] = email   # ⭐ STORE EMAIL
             return jsonify({"success":True,"redirect":"student.html"})
 
@@ -415,12 +2424,8 @@ def login():
     # -------- ADMIN LOGIN -------- #
     if role == "admin":
         hall_role = (data.get("hallRole") or data.get("hall_role") or "").strip().lower()
-        user = Admin.query.filter_by(
-            email=email,
-            password=password
-        ).first()
 
-        if user:
+        if valid:
             session["admin_email"] = email
             session["admin_hall_role"] = hall_role
             redirect_page = "admin2.html" if hall_role == "chanakya" else "admin.html"
@@ -428,9 +2433,20 @@ def login():
 
         return jsonify({"success":False,"message":"Invalid admin login"})
 
-    return jsonify({"success":False,"message":"Invalid role"})
-
 #---------------------Booking API-----------------------#
+@app.errorhandler(413)
+def upload_too_large(_error):
+    limit_mb = app.config["MAX_CONTENT_LENGTH"] // (1024 * 1024)
+    return jsonify({"success": False, "message": f"Upload too large. Documents may total at most {limit_mb} MB."}), 413
+
+def already_booked_response(booking):
+    slot_time = booking.slot_time if booking else "another slot"
+    return jsonify({
+        "success": False,
+        "message": f"You already booked a slot ({slot_time}). Multiple bookings are not allowed."
+    })
+
+
 @app.route("/submit-booking", methods=["POST"])
 def submit_booking():
     data = request.get_json(silent=True) or {}
@@ -461,12 +2477,9 @@ def submit_booking():
     if not class10_file or not class12_file:
         return jsonify({"success": False, "message": "Class 10 and Class 12 documents are required."})
 
-    existing_booking = TokenBooking.query.filter_by(student_email=email).first()
+    existing_booking = latest_booking_for(email)
     if existing_booking:
-        return jsonify({
-            "success": False,
-            "message": f"You already booked a slot ({existing_booking.slot_time}). Multiple bookings are not allowed."
-        })
+        return already_booked_response(existing_booking)
 
     slot_obj = Slot.query.filter_by(time=slot).first()
     if not slot_obj:
@@ -475,11 +2488,31 @@ def submit_booking():
     if slot_obj.capacity < needed_capacity:
         return jsonify({"success": False, "message": "Selected slot is full. Please choose another slot."})
 
+    # Write the documents before taking the slot's row lock so the
+    # reservation transaction below stays short.
+    saved_docs = []
+    new_docs = []
+    try:
+        for file_obj, label in (
+            (class10_file, "class10"),
+            (class12_file, "class12"),
+            (category_file, "category"),
+            (paid_receipt_file, "receipt"),
+        ):
+            stored_name, created = save_uploaded_file(file_obj, label)
+            saved_docs.append(stored_name)
+            if created:
+                new_docs.append(stored_name)
+    except UploadError as exc:
+        # Stored files may be shared with other bookings; the orphan sweep removes unused ones.
+        return jsonify({"success": False, "message": str(exc)})
+    class10_name, class12_name, category_name, receipt_name = saved_docs
+
+    if not reserve_slot_capacity(slot, needed_capacity):
+        db.session.rollback()
+        return jsonify({"success": False, "message": "Selected slot is full. Please choose another slot."})
+
     token_id = generate_token_id()
-    class10_name = save_uploaded_file(class10_file, email, "class10")
-    class12_name = save_uploaded_file(class12_file, email, "class12")
-    category_name = save_uploaded_file(category_file, email, "category")
-    receipt_name = save_uploaded_file(paid_receipt_file, email, "receipt")
 
     booking = TokenBooking(
         student_email=email,
@@ -491,11 +2524,28 @@ def submit_booking():
         class12_doc=class12_name,
         category_doc=category_name,
         paid_receipt_doc=receipt_name,
-        sent_to_chanakya=False
+        sent_to_chanakya=False,
+        booked_at=datetime.now(),
     )
-    slot_obj.capacity -= needed_capacity
     db.session.add(booking)
+    try:
+        db.session.flush()
+    except IntegrityError as exc:
+        # A concurrent submit for the same student got in first (ux_token_booking_live_student);
+        # rolling back also returns the seats reserved above.
+        db.session.rollback()
+        if "student_email" not in str(exc.orig) and "ux_token_booking_live_student" not in str(exc.orig):
+            raise
+        return already_booked_response(latest_booking_for(email))
+    retain_documents(saved_docs)
+    queue_version = bump_queue_version()
     db.session.commit()
+    slot_availability.refresh()
+    queue_index.add(booking, queue_version)
+    publish_queue_event("booking-added", booking, booking_to_view(booking))
+    audit("booking-created", booking, fee_status=fee, payment=booking.payment_mode)
+    # Shared files were already normalised (or are being) by the booking that stored them.
+    schedule_document_normalization(new_docs)
 
     # store lightweight data in session for success page
     session["booking"] = {
@@ -510,14 +2560,336 @@ def submit_booking():
         "redirect": "/success-token.html"
     })
 
+# ---------------- ADMISSION SLIPS ---------------- #
+
+def render_slip_pdf(booking):
+    html = render_template(
+        "final-registration-print.html",
+        booking=booking_to_view(booking),
+        generated_at=booking.final_registration_completed_at,
+        generated_by="Admissions Office",
+        slip_url=None,
+    )
+    return weasyprint.HTML(string=html).write_pdf()
+
+
+def ensure_slip(booking):
+    """Return the stored slip's file name, rendering it on first use.
+
+    A completed registration never changes, so the PDF is rendered once
+    and stored under the hash of its bytes.
+    """
+    if booking.slip_file and os.path.isfile(os.path.join(SLIP_DIR, booking.slip_file)):
+        return booking.slip_file
+    pdf = render_slip_pdf(booking)
+    name = hashlib.sha256(pdf).hexdigest() + ".pdf"
+    path = os.path.join(SLIP_DIR, name)
+    if not os.path.exists(path):
+        partial_path = f"{path}.{uuid.uuid4().hex[:8]}.part"
+        with open(partial_path, "wb") as out:
+            out.write(pdf)
+        os.replace(partial_path, path)
+    booking.slip_file = name
+    db.session.commit()
+    return name
+
+
+def generate_slip(booking_id):
+    with app.app_context():
+        booking = TokenBooking.query.get(booking_id)
+        if booking is None or not booking.final_registration_completed:
+            return
+        try:
+            ensure_slip(booking)
+        except Exception:  # the slip is rendered again on first download
+            app.logger.exception("Could not render slip for booking %s", booking_id)
+
+
+def schedule_slip(booking_id):
+    if weasyprint is not None:
+        document_workers.submit(generate_slip, booking_id)
+
+
+@app.route("/final-registration-slip/<int:booking_id>.pdf")
+def final_registration_slip(booking_id):
+    booking = find_booking(booking_id)
+    if not booking or not booking.final_registration_completed:
+        return abort(404)
+    if not session.get("admin_email") and session.get("student_email") != booking.student_email:
+        return abort(403)
+    if weasyprint is None:
+        return redirect(url_for("final_registration_print_page", booking_id=booking_id))
+    try:
+        name = ensure_slip(booking)
+    except Exception:  # fall back to the printable page rather than a 500
+        db.session.rollback()
+        app.logger.exception("Could not render slip for booking %s", booking_id)
+        return redirect(url_for("final_registration_print_page", booking_id=booking_id))
+    response = send_from_directory(
+        SLIP_DIR, name, mimetype="application/pdf", max_age=DOCUMENT_MAX_AGE,
+        download_name=f"final-registration-{booking.token_id}.pdf",
+    )
+    response.set_etag(name[:-len(".pdf")])
+    return cache_privately(response).make_conditional(request)
+
+
+def write_slips_zip(out, slot_time):
+    """Write every completed slip for a slot, live or archived, into a zip; returns the slip count."""
+    bookings = sorted((
+        booking for model in (TokenBooking, ArchivedBooking)
+        for booking in model.query.filter_by(slot_time=slot_time, final_registration_completed=True)
+    ), key=lambda booking: booking.id)
+    # PDFs are already compressed, so the archive just stores them.
+    with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_STORED) as archive:
+        for booking in bookings:
+            archive.write(os.path.join(SLIP_DIR, ensure_slip(booking)), f"{booking.token_id}.pdf")
+    return len(bookings)
+
+
+@app.cli.command("export-slips")
+@click.argument("slot_time")
+@click.argument("output", type=click.Path(dir_okay=False, writable=True))
+def export_slips_command(slot_time, output):
+    """Write the final registration slips for SLOT_TIME into the zip OUTPUT."""
+    if weasyprint is None:
+        raise click.ClickException("Install WeasyPrint to generate PDF slips.")
+    with open(output, "wb") as out:
+        count = write_slips_zip(out, slot_time)
+    click.echo(f"Wrote {count} slips to {output}.")
+
+
+@app.route("/admin/slips.zip")
+def export_slips_page():
+    if not session.get("admin_email"):
+        abort(403)
+    slot_time = request.args.get("slot")
+    if not slot_time or weasyprint is None:
+        abort(400 if not slot_time else 503)
+    archive = tempfile.TemporaryFile()
+    write_slips_zip(archive, slot_time)
+    archive.seek(0)
+    return send_file(
+        archive, mimetype="application/zip", as_attachment=True,
+        download_name=f"slips-{secure_filename(slot_time)}.zip",
+    )
+
+
+# ---------------- ROSTER IMPORT / EXPORT ---------------- #
+
+ROSTER_BATCH_SIZE = 1000
+
+
+def upsert_students(rows):
+    """Insert or update (email, password) rows in one executemany statement."""
+    statement = dialect_insert(Student.__table__)
+    statement = statement.on_conflict_do_update(
+        index_elements=[Student.__table__.c.email], set_={"password": statement.excluded.password}
+    )
+    db.session.execute(statement, rows)
+
+
+def read_roster_batches(stream, batch_size):
+    """Yield lists of (email, password) from a CSV with email and password columns.
+
+    Rows missing either value are skipped, as are fields beyond the header
+    (e.g. a trailing comma); a repeated email keeps its last row.
+    """
+    reader = csv.DictReader(stream)
+    missing = {"email", "password"} - {name.strip().lower() for name in reader.fieldnames or ()}
+    if missing:
+        raise click.ClickException(f"Roster is missing column(s): {', '.join(sorted(missing))}.")
+    batch = {}
+    for row in reader:
+        row = {key.strip().lower(): (value or "").strip() for key, value in row.items() if key is not None}
+        if "@" not in row["email"] or not row["password"]:
+            continue
+        batch[row["email"].lower()] = row["password"]
+        if len(batch) >= batch_size:
+            yield list(batch.items())
+            batch = {}
+    if batch:
+        yield list(batch.items())
+
+
+@app.cli.command("import-students")
+@click.argument("roster", type=click.File("r", encoding="utf-8-sig"))
+@click.option("--batch-size", default=ROSTER_BATCH_SIZE, show_default=True, help="Rows per insert.")
+@click.option("--workers", default=os.cpu_count() or 2, show_default=True, help="Password hashing processes.")
+def import_students_command(roster, batch_size, workers):
+    """Create or update students from a CSV roster with email,password columns."""
+    hash_one = partial(generate_password_hash, method=PASSWORD_HASH_METHOD)
+    started = time.perf_counter()
+    imported = 0
+    # Hash the whole roster first: on SQLite the write transaction below holds
+    # the database lock, and live bookings must not wait behind the hashing.
+    hashed_batches = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for batch in read_roster_batches(roster, batch_size):
+            hashes = pool.map(hash_one, [password for _, password in batch], chunksize=32)
+            hashed_batches.append([
+                {"email": email, "password": hashed} for (email, _), hashed in zip(batch, hashes)
+            ])
+            imported += len(batch)
+            click.echo(f"{imported} students hashed ({imported / (time.perf_counter() - started):.0f} rows/s)", err=True)
+    try:
+        for rows in hashed_batches:
+            upsert_students(rows)
+    except Exception:
+        db.session.rollback()
+        raise
+    # The whole roster is one transaction: a bad row leaves the table untouched.
+    db.session.commit()
+    credentials.invalidate()
+    elapsed = time.perf_counter() - started
+    click.echo(f"Imported {imported} students in {elapsed:.1f}s ({imported / max(elapsed, 1e-9):.0f} rows/s).")
+
+
+BOOKING_EXPORT_COLUMNS = (
+    TokenBooking.token_id,
+    TokenBooking.student_email,
+    TokenBooking.fee_status,
+    TokenBooking.payment_mode,
+    TokenBooking.slot_time,
+    TokenBooking.booked_at,
+    TokenBooking.sent_to_chanakya,
+    TokenBooking.sent_to_chanakya_at,
+    TokenBooking.final_registration_completed,
+    TokenBooking.registration_completed_at,
+)
+BOOKING_EXPORT_FIELDS = ("token_id", "student_email", "name", "roll_no") + tuple(
+    column.key for column in BOOKING_EXPORT_COLUMNS[2:]
+)
+
+
+def booking_export_query(day=None):
+    """Live and archived bookings (not rejected) in id order, as one UNION ALL."""
+    selects = []
+    for model in (TokenBooking, ArchivedBooking):
+        columns = [getattr(model, column.key) for column in BOOKING_EXPORT_COLUMNS]
+        query = select(model.id, *columns).where(model.rejected_at.is_(None))
+        if day is not None:
+            start = datetime.combine(day, datetime.min.time())
+            query = query.where(model.booked_at >= start, model.booked_at < start + timedelta(days=1))
+        selects.append(query)
+    bookings = union_all(*selects).subquery()
+    return select(*(bookings.c[column.key] for column in BOOKING_EXPORT_COLUMNS)).order_by(bookings.c.id.asc())
+
+
+def iter_booking_csv(day=None, batch_size=ROSTER_BATCH_SIZE):
+    """Yield the bookings, archived ones included, as CSV text a few rows at a time, oldest first."""
+    rows = db.session.execute(booking_export_query(day).execution_options(yield_per=batch_size))
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=BOOKING_EXPORT_FIELDS)
+    writer.writeheader()
+    for count, row in enumerate(rows, start=1):
+        record = dict(row._mapping)
+        record.update(parse_identity_from_email(row.student_email))
+        writer.writerow(record)
+        if count % 100 == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+@app.cli.command("export-bookings")
+@click.argument("output", type=click.File("w", encoding="utf-8"), default="-")
+@click.option("--date", "day", type=click.DateTime(formats=["%Y-%m-%d"]), help="Only bookings made on this day.")
+def export_bookings_command(output, day):
+    """Write bookings as CSV to OUTPUT (default stdout)."""
+    for chunk in iter_booking_csv(day.date() if day else None):
+        output.write(chunk)
+
+
+@app.route("/admin/bookings.csv")
+def export_bookings_page():
+    if not session.get("admin_email"):
+        abort(403)
+    day = None
+    if request.args.get("date"):
+        try:
+            day = datetime.strptime(request.args["date"], "%Y-%m-%d").date()
+        except ValueError:
+            abort(400)
+    filename = f"bookings-{day.isoformat() if day else 'all'}.csv"
+    return Response(
+        stream_with_context(iter_booking_csv(day)),
+        mimetype="text/csv",
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
+
+
+# ---------------- ARCHIVE ---------------- #
+
+ARCHIVE_BATCH_SIZE = 500
+
+
+def archivable_bookings(before):
+    """Ids of bookings that can leave the live table.
+
+    Those are registrations completed before `before` and rejected
+    bookings whose documents the sweeper has already removed. The newest
+    booking always stays: SQLite hands out max(id) + 1 as the next id, so
+    deleting it could give a new booking the id of an archived one.
+    """
+    newest = db.session.query(db.func.max(TokenBooking.id)).execution_options(include_rejected=True).scalar()
+    return db.session.query(TokenBooking.id).filter(
+        TokenBooking.id < (newest or 0),
+        or_(
+            and_(
+                TokenBooking.final_registration_completed.is_(True),
+                or_(TokenBooking.registration_completed_at < before, TokenBooking.registration_completed_at.is_(None)),
+            ),
+            TokenBooking.documents_swept_at.isnot(None),
+        ),
+    ).order_by(TokenBooking.id.asc()).execution_options(include_rejected=True)
+
+
+def archive_bookings(before, batch_size=ARCHIVE_BATCH_SIZE):
+    """Move finished bookings into archived_booking, one transaction per batch; returns the count."""
+    live = TokenBooking.__table__
+    columns = [column.name for column in live.columns]
+    moved = 0
+    while True:
+        ids = [booking_id for (booking_id,) in archivable_bookings(before).limit(batch_size)]
+        if not ids:
+            return moved
+        db.session.execute(ArchivedBooking.__table__.insert().from_select(
+            columns + ["archived_at"],
+            select(*live.columns, literal(datetime.now())).where(live.c.id.in_(ids)),
+        ))
+        db.session.execute(live.delete().where(live.c.id.in_(ids)))
+        db.session.commit()
+        for booking_id in ids:
+            booking_projections.discard(booking_id)
+        moved += len(ids)
+
+
+@app.cli.command("archive-bookings")
+@click.option("--before", type=click.DateTime(formats=["%Y-%m-%d"]), default=None,
+              help="Archive registrations completed before this date (default: today).")
+@click.option("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE, show_default=True)
+def archive_bookings_command(before, batch_size):
+    """Move completed and swept rejected bookings out of the live table."""
+    before = before or datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    moved = archive_bookings(before, batch_size)
+    click.echo(f"Archived {moved} bookings completed before {before:%Y-%m-%d} or rejected.")
+
+
 # ---------------- INIT DB ---------------- #
 
-with app.app_context():
+def init_database():
+    """Create tables, apply migrations and seed an empty database.
+
+    Runs once per deployment through `flask init-db` (or when the app is
+    started directly), never on import, so worker processes start without
+    touching the schema.
+    """
     db.create_all()
-    ensure_tokenbooking_columns()
+    run_migrations()
 
     if not Student.query.first():
-        db.session.add_all([
+        seed_students = [
             Student(email="kannam_b250921ec@nitc.ac.in",password="nitc@1234"),
             Student(email="karthik_b250298ec@nitc.ac.in",password="nitc@1234"),
             Student(email="katamala_b250300ec@nitc.ac.in",password="nitc@1234"),
@@ -568,11 +2940,19 @@ with app.app_context():
             Student(email="pranav_b250413ec@nitc.ac.in",password="nitc@1234"),
             Student(email="precious_b251125ec@nitc.ac.in",password="nitc@1234"),
             Student(email="priyadarshana_b251127ec@nitc.ac.in",password="nitc@1234")            
-        ])
+        ]
+        for student, hashed in zip(seed_students, hash_passwords(s.password for s in seed_students)):
+            student.password = hashed
+        db.session.add_all(seed_students)
+
+    if not TokenCounter.query.get("booking"):
+        db.session.add(TokenCounter(name="booking", value=TOKEN_SEQUENCE_START - 1))
+    if not TokenCounter.query.get("queue"):
+        db.session.add(TokenCounter(name="queue", value=0))
 
     if not Admin.query.first():
         db.session.add(
-            Admin(email="jimmy@nitc.ac.in",password="jimmy@1234")
+            Admin(email="jimmy@nitc.ac.in",password=hash_password("jimmy@1234"))
         )
 
     db.session.commit()
@@ -593,8 +2973,27 @@ with app.app_context():
         db.session.commit()
 
 
+@app.cli.command("init-db")
+def init_db_command():
+    """Create tables, run pending migrations and seed demo data."""
+    init_database()
+    click.echo("Database is ready.")
+
+
+def create_app():
+    """Return the app for a production WSGI server (see wsgi.py).
+
+    Routes are registered on the module-level app, so this validates the
+    production settings and hands that app back.
+    """
+    if app.config["SECRET_KEY"] == DEV_SECRET_KEY:
+        raise RuntimeError("Set SECRET_KEY before serving the app in production.")
+    return app
+
 
 # ---------------- RUN ---------------- #
 
 if __name__ == "__main__":
+    with app.app_context():
+        init_database()
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,138 @@
+"""Fingerprinted, precompressed copies of the static files.
+
+`build` copies every file under the static folder to an output directory
+as name.<hash>.ext, next to .gz and (when the brotli package is
+installed) .br versions, and writes manifest.json mapping each original
+name to its fingerprinted one. A fingerprinted file never changes, so it
+can be cached for a year; a changed source file gets a new name.
+
+The files of the previous KEEP_BUILDS - 1 builds stay in place (their
+manifests are listed in manifest-history.json) and are still served, so
+pages rendered before a deploy, or cached in a browser, can load them.
+"""
+import gzip
+import hashlib
+import json
+import os
+
+try:
+    import brotli
+except ImportError:  # optional; without it only gzip copies are built.
+    brotli = None
+
+MANIFEST = "manifest.json"
+HISTORY = "manifest-history.json"
+# Builds whose files are kept, the current one included.
+KEEP_BUILDS = 3
+COMPRESSIBLE = (".js", ".css", ".svg", ".json", ".txt", ".html")
+# Compressed copies smaller than this fraction of the original are not worth serving.
+MIN_SAVING = 0.9
+
+
+def _fingerprinted(name, content):
+    root, ext = os.path.splitext(name)
+    return f"{root}.{hashlib.sha256(content).hexdigest()[:12]}{ext}"
+
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "wb") as out:
+        out.write(content)
+    os.replace(path + ".tmp", path)
+
+
+def _read_history(output_dir):
+    try:
+        with open(os.path.join(output_dir, HISTORY), encoding="utf-8") as history:
+            return json.load(history)
+    except FileNotFoundError:
+        return []
+
+
+def build(source_dir, output_dir, keep_builds=KEEP_BUILDS):
+    """Build the output directory; returns {name: (fingerprinted name, {encoding: size})}."""
+    output_dir = os.path.abspath(output_dir)
+    built = {}
+    for root, dirs, files in os.walk(source_dir):
+        dirs[:] = sorted(d for d in dirs if os.path.abspath(os.path.join(root, d)) != output_dir)
+        for filename in sorted(files):
+            path = os.path.join(root, filename)
+            name = os.path.relpath(path, source_dir).replace(os.sep, "/")
+            with open(path, "rb") as source:
+                content = source.read()
+            target = _fingerprinted(name, content)
+            target_path = os.path.join(output_dir, target)
+            _write(target_path, content)
+            sizes = {"identity": len(content)}
+            if filename.endswith(COMPRESSIBLE):
+                variants = {"gzip": (".gz", gzip.compress(content, compresslevel=9, mtime=0))}
+                if brotli is not None:
+                    variants["br"] = (".br", brotli.compress(content, quality=11))
+                for encoding, (suffix, compressed) in variants.items():
+                    if len(compressed) < len(content) * MIN_SAVING:
+                        _write(target_path + suffix, compressed)
+                        sizes[encoding] = len(compressed)
+            built[name] = (target, sizes)
+    manifest = {name: {"file": target, "encodings": sorted(sizes)} for name, (target, sizes) in built.items()}
+    # Newest first; rebuilding unchanged sources does not push an older build out.
+    history = [manifest] + [m for m in _read_history(output_dir) if m != manifest]
+    history = history[:max(keep_builds, 1)]
+    _write(os.path.join(output_dir, HISTORY), json.dumps(history, indent=2, sort_keys=True).encode())
+    _write(os.path.join(output_dir, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    _remove_stale(output_dir, history)
+    return built
+
+
+def _remove_stale(output_dir, history):
+    keep = {MANIFEST, HISTORY}
+    for manifest in history:
+        for entry in manifest.values():
+            keep.add(entry["file"])
+            keep.update(entry["file"] + suffix for suffix in (".gz", ".br"))
+    for root, _, files in os.walk(output_dir):
+        for filename in files:
+            path = os.path.join(root, filename)
+            if os.path.relpath(path, output_dir).replace(os.sep, "/") not in keep:
+                os.remove(path)
+
+
+class AssetManifest:
+    """Read side of manifest.json, reloaded whenever the file changes.
+
+    `lookup` only returns files of the current build; `encodings` also knows
+    the files of the earlier builds that are still kept.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._path = os.path.join(directory, MANIFEST)
+        self._mtime = None
+        self._entries = {}
+        self._encodings = {}
+
+    def _refresh(self):
+        try:
+            mtime = os.path.getmtime(self._path)
+        except FileNotFoundError:
+            self._mtime, self._entries, self._encodings = None, {}, {}
+            return
+        if mtime == self._mtime:
+            return
+        with open(self._path, encoding="utf-8") as manifest:
+            entries = json.load(manifest)
+        self._entries = {name: entry["file"] for name, entry in entries.items()}
+        self._encodings = {}
+        for previous in reversed(_read_history(self.directory)):
+            self._encodings.update((entry["file"], set(entry["encodings"])) for entry in previous.values())
+        self._encodings.update((entry["file"], set(entry["encodings"])) for entry in entries.values())
+        self._mtime = mtime
+
+    def lookup(self, name):
+        """Fingerprinted name for a static file, or None if it has not been built."""
+        self._refresh()
+        return self._entries.get(name)
+
+    def encodings(self, fingerprinted):
+        """Encodings built for a fingerprinted file ("identity", "gzip", "br"); empty if unknown."""
+        self._refresh()
+        return self._encodings.get(fingerprinted, set())
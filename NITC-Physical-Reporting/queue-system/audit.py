@@ -0,0 +1,132 @@
+"""Audit trail of queue transitions: a batching writer and a replayer.
+
+Routes hand events to `BatchWriter.submit`, which only appends to an
+in-memory queue; a background thread drains it and passes whole batches
+to the `flush` callable (one multi-row INSERT in the app). `replay`
+rebuilds queue state and per-desk throughput from stored events alone.
+"""
+import atexit
+import os
+import threading
+from collections import defaultdict
+from queue import Empty, Full, Queue
+
+
+class BatchWriter:
+    """Collect records on a bounded queue and flush them in batches.
+
+    The flush thread is started on first use in each process, so the
+    writer survives pre-fork servers. When the queue is full, records
+    are dropped and counted rather than blocking the request.
+    """
+
+    def __init__(self, flush, batch_size=200, interval=1.0, max_pending=10_000, logger=None):
+        self._flush = flush
+        self._batch_size = batch_size
+        self._interval = interval
+        self._queue = Queue(maxsize=max_pending)
+        self._logger = logger
+        self._lock = threading.Lock()
+        self._pid = None
+        self.dropped = 0
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                # Forked child: the parent's backlog and thread are not ours.
+                self._queue = Queue(maxsize=self._queue.maxsize)
+            thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+            thread.start()
+            self._pid = os.getpid()
+        atexit.register(self.drain)
+
+    def submit(self, record):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(record)
+        except Full:
+            self.dropped += 1
+            if self._logger:
+                self._logger.warning("Audit queue full; dropped %s", record.get("event"))
+
+    def _take_batch(self, timeout):
+        batch = []
+        try:
+            batch.append(self._queue.get(timeout=timeout))
+            while len(batch) < self._batch_size:
+                batch.append(self._queue.get_nowait())
+        except Empty:
+            pass
+        return batch
+
+    def _write(self, batch):
+        try:
+            self._flush(batch)
+        except Exception:
+            if self._logger:
+                self._logger.exception("Could not write %d audit events", len(batch))
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+    def _run(self):
+        while True:
+            batch = self._take_batch(self._interval)
+            if batch:
+                self._write(batch)
+
+    def drain(self):
+        """Block until everything submitted so far has been flushed."""
+        if self._pid == os.getpid():
+            self._queue.join()
+
+
+def replay(events):
+    """Rebuild queue state from (event, booking_id, queue, actor, counter, created_at) rows.
+
+    Returns the ids still waiting for verification, waiting in the
+    Chanakya hall, completed and rejected, plus per-desk throughput keyed
+    by (admin, counter): approvals, the mean gap between consecutive
+    approvals in seconds, and approvals per hour of activity.
+    """
+    waiting, in_hall = {}, set()
+    completed, rejected = set(), set()
+    desks = defaultdict(lambda: {"approved": 0, "first": None, "last": None, "gaps": 0.0})
+    for event, booking_id, queue, actor, counter, created_at in events:
+        if event == "booking-created":
+            waiting[booking_id] = queue
+        elif event == "booking-approved":
+            waiting.pop(booking_id, None)
+            in_hall.add(booking_id)
+            desk = desks[(actor, counter)]
+            if desk["last"] is not None:
+                desk["gaps"] += (created_at - desk["last"]).total_seconds()
+            desk["first"] = desk["first"] or created_at
+            desk["last"] = created_at
+            desk["approved"] += 1
+        elif event == "booking-rejected":
+            waiting.pop(booking_id, None)
+            in_hall.discard(booking_id)
+            rejected.add(booking_id)
+        elif event == "registration-completed":
+            in_hall.discard(booking_id)
+            completed.add(booking_id)
+    throughput = {}
+    for key, desk in desks.items():
+        active_hours = (desk["last"] - desk["first"]).total_seconds() / 3600
+        throughput[key] = {
+            "approved": desk["approved"],
+            "mean_gap_seconds": desk["gaps"] / (desk["approved"] - 1) if desk["approved"] > 1 else None,
+            "per_hour": (desk["approved"] - 1) / active_hours if active_hours > 0 else None,
+        }
+    return {
+        "waiting": waiting,
+        "in_hall": in_hall,
+        "completed": completed,
+        "rejected": rejected,
+        "throughput": throughput,
+    }
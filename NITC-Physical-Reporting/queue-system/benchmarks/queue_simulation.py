@@ -0,0 +1,137 @@
+"""Discrete-event simulation of a reporting day through both halls.
+
+Students arrive spread over their booked hourly slots, wait in the X or Y
+lane of the verification hall, are served by one of its counters, then
+queue (first come, first served) for a Chanakya hall counter. Each
+scenario is run with the lane policies from scheduler.py and compared
+with the single-desk FIFO the app started with. Reports mean and p95
+verification wait per lane, time in system, and counter utilisation.
+
+    python benchmarks/queue_simulation.py --students 320 --counters 2 --runs 20
+"""
+import argparse
+import heapq
+import itertools
+import os
+import random
+import statistics
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scheduler import Hall, make_policy, parse_weights  # noqa: E402
+
+SLOT_SECONDS = 60 * 60
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] if ordered else 0
+
+
+def simulate(rng, args, policy, counters):
+    """Run one day; returns per-student records and per-hall busy seconds."""
+    means = {"X": args.quick_seconds, "Y": args.detailed_seconds}
+    verification = Hall([f"desk-{n}" for n in range(1, counters + 1)], policy)
+    chanakya = Hall([f"hall-{n}" for n in range(1, args.chanakya_counters + 1)], make_policy("fifo"))
+    events = []
+    sequence = itertools.count()
+    students = {}
+    busy = {"verification": 0.0, "chanakya": 0.0}
+
+    for student in range(args.students):
+        slot = rng.randrange(args.slots)
+        arrived = slot * SLOT_SECONDS + rng.uniform(0, SLOT_SECONDS)
+        lane = "X" if rng.random() < args.quick_share else "Y"
+        students[student] = {"lane": lane, "arrived": arrived}
+        heapq.heappush(events, (arrived, next(sequence), "arrive", student))
+
+    def dispatch(hall, name, now):
+        for counter in hall.free_counters():
+            called = hall.call_next(counter, now)
+            if called is None:
+                return
+            lane, student, _ = called
+            if name == "verification":
+                students[student]["called"] = now
+                service = rng.expovariate(1 / means[lane])
+            else:
+                service = rng.expovariate(1 / args.chanakya_seconds)
+            busy[name] += service
+            heapq.heappush(events, (now + service, next(sequence), f"done-{name}", counter))
+
+    while events:
+        now, _, kind, subject = heapq.heappop(events)
+        if kind == "arrive":
+            verification.arrive(subject, students[subject]["lane"], now)
+        elif kind == "done-verification":
+            _, student = verification.complete(subject)
+            chanakya.arrive(student, "X", now)
+        else:
+            _, student = chanakya.complete(subject)
+            students[student]["left"] = now
+        dispatch(verification, "verification", now)
+        dispatch(chanakya, "chanakya", now)
+
+    return list(students.values()), busy
+
+
+def summarise(runs, counters, chanakya_counters):
+    waits = {"X": [], "Y": []}
+    in_system, utilisation, chanakya_utilisation = [], [], []
+    for records, busy in runs:
+        day_end = max(record["left"] for record in records)
+        for record in records:
+            waits[record["lane"]].append((record["called"] - record["arrived"]) / 60)
+            in_system.append((record["left"] - record["arrived"]) / 60)
+        utilisation.append(busy["verification"] / (counters * day_end))
+        chanakya_utilisation.append(busy["chanakya"] / (chanakya_counters * day_end))
+    all_waits = waits["X"] + waits["Y"]
+    return {
+        "wait": statistics.mean(all_waits),
+        "wait_x": statistics.mean(waits["X"]) if waits["X"] else 0,
+        "wait_y": statistics.mean(waits["Y"]) if waits["Y"] else 0,
+        "p95_x": percentile(waits["X"], 95),
+        "p95_y": percentile(waits["Y"], 95),
+        "in_system": statistics.mean(in_system),
+        "utilisation": statistics.mean(utilisation),
+        "chanakya_utilisation": statistics.mean(chanakya_utilisation),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=320)
+    parser.add_argument("--slots", type=int, default=8, help="hourly booking slots")
+    parser.add_argument("--quick-share", type=float, default=0.5, help="fraction of students in the X lane")
+    parser.add_argument("--quick-seconds", type=float, default=180, help="mean X review time")
+    parser.add_argument("--detailed-seconds", type=float, default=360, help="mean Y consultation time")
+    parser.add_argument("--chanakya-seconds", type=float, default=240, help="mean Chanakya hall service time")
+    parser.add_argument("--counters", type=int, default=2, help="verification counters")
+    parser.add_argument("--chanakya-counters", type=int, default=2)
+    parser.add_argument("--weights", default="X:2,Y:1", help="lane weights for the weighted policy")
+    parser.add_argument("--max-wait", type=float, default=30, help="sej starvation limit, minutes")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    means = {"X": args.quick_seconds, "Y": args.detailed_seconds}
+    scenarios = [("baseline: 1 desk, fifo", 1, "fifo")] + [
+        (f"{args.counters} desks, {name}", args.counters, name) for name in ("fifo", "weighted", "sej")
+    ]
+    print(f"{'scenario':<26} {'wait':>6} {'X wait':>7} {'Y wait':>7} {'X p95':>6} {'Y p95':>6} "
+          f"{'in sys':>7} {'desk util':>9} {'hall util':>9}   (minutes)")
+    for label, counters, policy_name in scenarios:
+        runs = []
+        for run in range(args.runs):
+            # Every scenario sees the same arrivals for a given run.
+            policy = make_policy(policy_name, parse_weights(args.weights), means.get, args.max_wait * 60)
+            runs.append(simulate(random.Random(args.seed + run), args, policy, counters))
+        result = summarise(runs, counters, args.chanakya_counters)
+        print(f"{label:<26} {result['wait']:>6.1f} {result['wait_x']:>7.1f} {result['wait_y']:>7.1f} "
+              f"{result['p95_x']:>6.1f} {result['p95_y']:>6.1f} {result['in_system']:>7.1f} "
+              f"{result['utilisation']:>9.0%} {result['chanakya_utilisation']:>9.0%}")
+
+
+if __name__ == "__main__":
+    main()
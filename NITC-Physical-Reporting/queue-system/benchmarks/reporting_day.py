@@ -0,0 +1,197 @@
+"""Reporting-day load test for the queue system.
+
+Seeds students into a throwaway SQLite database and replays a reporting
+day against the app in-process through the WSGI test client: concurrent
+logins, bookings with document uploads, then livestatus polling while
+admins proceed or reject students from the front of the queue. Prints
+p50/p95/p99 latency and throughput per route. Network time is not
+included, so the numbers isolate what the Flask worker itself spends.
+
+    python benchmarks/reporting_day.py --students 500 --workers 16
+"""
+import argparse
+import base64
+import io
+import math
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASSWORD = "bench@1234"
+# A valid 1x1 PNG; padded to --doc-kb to stand in for a scanned certificate.
+PNG_1X1 = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAAAAAA6fptVAAAACklEQVR4nGP4DwABAQEAsTj2FAAAAABJRU5ErkJggg=="
+)
+
+
+class LatencyRecorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = defaultdict(list)
+        self._errors = defaultdict(int)
+        self._windows = {}
+
+    def record(self, route, started, ok):
+        finished = time.perf_counter()
+        with self._lock:
+            self._samples[route].append(finished - started)
+            if not ok:
+                self._errors[route] += 1
+            first, last = self._windows.get(route, (started, finished))
+            self._windows[route] = (min(first, started), max(last, finished))
+
+    def report(self):
+        print(f"{'route':<28} {'reqs':>6} {'err':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for route, samples in self._samples.items():
+            ordered = sorted(samples)
+            first, last = self._windows[route]
+            throughput = len(ordered) / max(last - first, 1e-9)
+
+            def pct(p):
+                return ordered[min(len(ordered) - 1, math.ceil(p / 100 * len(ordered)) - 1)] * 1000
+
+            print(f"{route:<28} {len(ordered):>6} {self._errors[route]:>5} {throughput:>8.1f} "
+                  f"{pct(50):>8.1f} {pct(95):>8.1f} {pct(99):>8.1f}")
+
+
+def timed(recorder, route, send):
+    started = time.perf_counter()
+    try:
+        response = send()
+    except Exception:  # a crashed request still counts against the route
+        recorder.record(route, started, False)
+        return None
+    ok = response.status_code < 400 and (not response.is_json or response.json.get("success", True))
+    recorder.record(route, started, ok)
+    return response
+
+
+def seed(queue_app, students):
+    # One shared hash keeps seeding fast; logins still pay the full check.
+    password_hash = queue_app.hash_password(PASSWORD)
+    with queue_app.app.app_context():
+        queue_app.init_database()
+        queue_app.db.session.execute(queue_app.Student.__table__.insert(), [
+            {"email": f"student{n}_b{n:06d}ec@nitc.ac.in", "password": password_hash} for n in range(students)
+        ])
+        slots = queue_app.Slot.query.all()
+        # Every student books; unpaid students take two units.
+        per_slot = math.ceil(students * 2 / len(slots))
+        for slot in slots:
+            slot.capacity = per_slot
+        queue_app.db.session.commit()
+        return [slot.time for slot in slots]
+
+
+def student_session(queue_app, recorder, n, slot_times, document, rng):
+    client = queue_app.app.test_client()
+    email = f"student{n}_b{n:06d}ec@nitc.ac.in"
+    timed(recorder, "POST /login (student)", lambda: client.post(
+        "/login", json={"role": "student", "email": email, "password": PASSWORD}
+    ))
+    fee = rng.choice(["yes", "no"])
+    form = {
+        "slot": rng.choice(slot_times),
+        "fee": fee,
+        "payment": "on-spot",
+        "docClass10": (io.BytesIO(document), "class10.png"),
+        "docClass12": (io.BytesIO(document), "class12.png"),
+    }
+    if fee == "yes":
+        form["paidReceipt"] = (io.BytesIO(document), "receipt.png")
+    timed(recorder, "POST /submit-booking", lambda: client.post("/submit-booking", data=form))
+    return client
+
+
+def poll_livestatus(recorder, client, stop):
+    while not stop.is_set():
+        timed(recorder, "GET /livestatus.html", lambda: client.get("/livestatus.html"))
+
+
+def run_desk(queue_app, recorder, stop, actions, rng):
+    client = queue_app.app.test_client()
+    timed(recorder, "POST /login (admin)", lambda: client.post(
+        "/login", json={"role": "admin", "email": "jimmy@nitc.ac.in", "password": "jimmy@1234"}
+    ))
+    while not stop.is_set() and actions > 0:
+        page = client.get("/api/bookings?sent_to_chanakya=false&order=asc&limit=5").json
+        if not page["bookings"]:
+            break
+        booking_id = rng.choice(page["bookings"])["id"]
+        if rng.random() < 0.1:
+            timed(recorder, "POST /reject-booking", lambda: client.post(
+                "/reject-booking", json={"booking_id": booking_id}
+            ))
+        else:
+            timed(recorder, "POST /proceed-to-chanakya", lambda: client.post(
+                "/proceed-to-chanakya", json={"booking_id": booking_id}
+            ))
+        timed(recorder, "GET /admin.html", lambda: client.get("/admin.html"))
+        actions -= 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=300)
+    parser.add_argument("--workers", type=int, default=16, help="concurrent student sessions")
+    parser.add_argument("--pollers", type=int, default=32, help="students polling livestatus")
+    parser.add_argument("--desks", type=int, default=2, help="admin desks processing the queue")
+    parser.add_argument("--desk-actions", type=int, default=100, help="proceed/reject actions per desk")
+    parser.add_argument("--doc-kb", type=int, default=200, help="size of each fake document upload")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="nitc-bench-")
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(workdir, "bench.db")
+    os.environ["UPLOAD_DIR"] = os.path.join(workdir, "uploads")
+    os.makedirs(os.environ["UPLOAD_DIR"])
+    # Every virtual student logs in from the same address; lift the
+    # per-address login limit unless it is the thing being measured.
+    os.environ.setdefault("LOGIN_IP_BURST", str(args.students * 2))
+    sys.path.insert(0, APP_DIR)
+    import app as queue_app
+
+    rng = random.Random(args.seed)
+    document = PNG_1X1 + b"\0" * max(0, args.doc_kb * 1024 - len(PNG_1X1))
+    slot_times = seed(queue_app, args.students)
+    recorder = LatencyRecorder()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        clients = list(pool.map(
+            lambda n: student_session(queue_app, recorder, n, slot_times, document, random.Random(n)),
+            range(args.students),
+        ))
+    print(f"logins + bookings: {time.perf_counter() - started:.1f}s")
+
+    stop = threading.Event()
+    pollers = [
+        threading.Thread(target=poll_livestatus, args=(recorder, client, stop))
+        for client in rng.sample(clients, min(args.pollers, len(clients)))
+    ]
+    desks = [
+        threading.Thread(target=run_desk, args=(queue_app, recorder, stop, args.desk_actions, random.Random(d)))
+        for d in range(args.desks)
+    ]
+    started = time.perf_counter()
+    for thread in pollers + desks:
+        thread.start()
+    for thread in desks:
+        thread.join()
+    stop.set()
+    for thread in pollers:
+        thread.join()
+    print(f"polling + desk actions: {time.perf_counter() - started:.1f}s")
+
+    recorder.report()
+    print(f"database and uploads: {workdir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Token allocation latency as the booking table grows.
+
+Fills a throwaway SQLite database with bookings and, at each checkpoint,
+times `generate_token_id` plus the booking insert and commit it is paired
+with in `submit_booking`. Latency should stay flat as the table grows.
+
+    python benchmarks/token_allocation.py --bookings 20000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def add_booking(queue_app, token_id, n):
+    queue_app.db.session.add(queue_app.TokenBooking(
+        student_email=f"bench{n}_b{n:06d}ec@nitc.ac.in",
+        fee_status="yes",
+        payment_mode="already-paid",
+        slot_time="9:00 AM - 10:00 AM",
+        token_id=token_id,
+        sent_to_chanakya=False,
+    ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bookings", type=int, default=20000, help="table size to grow to")
+    parser.add_argument("--checkpoints", type=int, default=5, help="number of measurement points")
+    parser.add_argument("--samples", type=int, default=200, help="timed allocations per checkpoint")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="nitc-bench-")
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(workdir, "bench.db")
+    sys.path.insert(0, APP_DIR)
+    import app as queue_app
+
+    with queue_app.app.app_context():
+        queue_app.init_database()
+    step = max(1, args.bookings // args.checkpoints)
+    print(f"{'bookings':>10} {'mean us':>10} {'p50 us':>10} {'p99 us':>10}")
+    with queue_app.app.app_context():
+        created = 0
+        while created <= args.bookings:
+            samples = []
+            for _ in range(args.samples):
+                started = time.perf_counter()
+                add_booking(queue_app, queue_app.generate_token_id(), created)
+                queue_app.db.session.commit()
+                samples.append((time.perf_counter() - started) * 1e6)
+                created += 1
+            print(f"{created:>10} {statistics.mean(samples):>10.0f} "
+                  f"{percentile(samples, 50):>10.0f} {percentile(samples, 99):>10.0f}")
+
+            # Grow the table to the next checkpoint in one transaction.
+            for _ in range(step - args.samples):
+                add_booking(queue_app, queue_app.generate_token_id(), created)
+                created += 1
+            queue_app.db.session.commit()
+    print(f"database: {workdir}")
+
+
+if __name__ == "__main__":
+    main()
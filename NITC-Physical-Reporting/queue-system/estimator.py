@@ -0,0 +1,97 @@
+"""Service-time estimates for the verification desk.
+
+The desk serves one student at a time, so the time it spent on a student
+is the gap between that student's departure and the previous departure,
+or since the student arrived if the desk was idle in between. Each lane
+(X quick review, Y detailed consultation) keeps an exponentially weighted
+moving average of those gaps, updated in O(1) per departure.
+"""
+import math
+import threading
+
+
+class ServiceTimeEstimator:
+    """Per-lane EWMA of desk service times, in seconds.
+
+    `priors` seeds every lane's mean so estimates are usable before the
+    first departure is seen. `loader`, if given, is called once on first
+    use and must return (lane, arrived_at, departed_at) tuples to replay,
+    which lets a freshly started process pick up the day's history.
+    """
+
+    def __init__(self, priors, alpha=0.2, max_sample_seconds=60 * 60, loader=None):
+        self._priors = dict(priors)
+        self._means = dict(priors)
+        self._samples = {lane: 0 for lane in priors}
+        self._alpha = alpha
+        self._max_sample_seconds = max_sample_seconds
+        self._loader = loader
+        self._replayed_until = None
+        self._lock = threading.RLock()
+
+    def _ensure_loaded(self):
+        if self._loader is not None:
+            loader, self._loader = self._loader, None
+            self.replay(loader())
+
+    def record_departure(self, lane, arrived_at, previous_departure, departed_at):
+        """Fold one departure into the lane's average.
+
+        Departures without a previous departure to measure from, departures
+        already covered by the loader's history, and gaps that are negative
+        or longer than `max_sample_seconds` (desk breaks, clock skew) are
+        ignored.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            if self._replayed_until is not None and departed_at <= self._replayed_until:
+                return
+            self._record(lane, arrived_at, previous_departure, departed_at)
+
+    def _record(self, lane, arrived_at, previous_departure, departed_at):
+        # Callers hold self._lock.
+        if previous_departure is None:
+            return
+        started_at = max(arrived_at, previous_departure) if arrived_at else previous_departure
+        sample = (departed_at - started_at).total_seconds()
+        if sample <= 0 or sample > self._max_sample_seconds:
+            return
+        mean = self._means.get(lane, sample)
+        self._means[lane] = mean + self._alpha * (sample - mean)
+        self._samples[lane] = self._samples.get(lane, 0) + 1
+
+    def replay(self, departures):
+        """Fold a history of (lane, arrived_at, departed_at) events into the averages."""
+        with self._lock:
+            previous_departure = None
+            for lane, arrived_at, departed_at in sorted(departures, key=lambda event: event[2]):
+                self._record(lane, arrived_at, previous_departure, departed_at)
+                previous_departure = departed_at
+            if previous_departure is not None:
+                self._replayed_until = max(previous_departure, self._replayed_until or previous_departure)
+
+    def mean_minutes(self, lane):
+        with self._lock:
+            self._ensure_loaded()
+            return self._means.get(lane, 0) / 60
+
+    def expected_minutes(self, ahead):
+        """Minutes until a student is served, given {lane: students ahead}."""
+        with self._lock:
+            self._ensure_loaded()
+            seconds = sum(count * self._means.get(lane, 0) for lane, count in ahead.items())
+        return math.ceil(seconds / 60)
+
+    def snapshot(self):
+        with self._lock:
+            self._ensure_loaded()
+            return {
+                lane: {"mean_seconds": round(self._means[lane], 1), "samples": self._samples.get(lane, 0)}
+                for lane in self._means
+            }
+
+    def reset(self):
+        with self._lock:
+            self._means = dict(self._priors)
+            self._samples = {lane: 0 for lane in self._priors}
+            self._replayed_until = None
@@ -0,0 +1,28 @@
+"""gunicorn settings, read automatically when gunicorn starts in this directory.
+
+Every open /queue/stream (live status tabs, admin dashboards) holds a
+server thread for as long as the tab stays open, so the default sync
+worker (one request at a time) would be used up by a handful of tabs and
+killed after `timeout`. gthread workers serve each connection on its own
+thread and only need the process itself to stay responsive. The app
+admits QUEUE_STREAM_LIMIT student streams per worker (half the threads by
+default) and lets further tabs poll, so ordinary requests keep a thread.
+
+Override with GUNICORN_WORKERS / GUNICORN_THREADS, or set
+QUEUE_STREAM_ENABLED=0 to turn the stream off.
+"""
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+worker_class = "gthread"
+workers = int(os.environ.get("GUNICORN_WORKERS", 4))
+threads = int(os.environ.get("GUNICORN_THREADS", 32))
+
+
+def on_starting(server):
+    # Workers add their metrics up through files in METRICS_DIR (see metrics.py);
+    # start every server from zero so totals of an earlier run are not carried over.
+    import shutil
+
+    directory = os.environ.get("METRICS_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance", "metrics")
+    shutil.rmtree(directory, ignore_errors=True)
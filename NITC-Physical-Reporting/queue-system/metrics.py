@@ -0,0 +1,208 @@
+"""In-process metrics served in the Prometheus text exposition format.
+
+Counters and histograms are kept in plain dicts behind one lock and
+rendered on scrape; gauges are computed by the caller at scrape time and
+passed to `render`. There is no dependency on prometheus_client.
+
+With a `directory`, each process also writes its values to a file of its
+own there every `flush_seconds`, and `render` adds up every file, so a
+scrape that reaches any one worker reports totals for all of them. Files
+of workers that have exited are kept, otherwise counters would go
+backwards; clear the directory when the server (not a worker) starts.
+"""
+import atexit
+import bisect
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+
+def _format_labels(labels, extra=None):
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (
+        (key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in pairs
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _sort_key(key):
+    return tuple((name, str(value)) for name, value in key)
+
+
+def _copy(value):
+    return [list(value[0]), value[1], value[2]] if isinstance(value, list) else value
+
+
+def _add(total, value):
+    """Add a counter value or a [bucket counts, sum, count] histogram series to `total`."""
+    if total is None:
+        return _copy(value)
+    if isinstance(total, list):
+        return [[a + b for a, b in zip(total[0], value[0])], total[1] + value[1], total[2] + value[2]]
+    return total + value
+
+
+class MetricsRegistry:
+    """Counters, histograms and a ring of slow-query samples.
+
+    Metrics must be declared with `counter` or `histogram` before they are
+    updated; labels are passed as keyword arguments on every update.
+    """
+
+    def __init__(self, slow_query_samples=50, directory=None, flush_seconds=5):
+        self._lock = threading.Lock()
+        self._kinds = {}        # name -> (kind, help, buckets)
+        self._values = {}       # name -> {label tuple: value or [bucket counts, sum, count]}
+        self.slow_queries = deque(maxlen=slow_query_samples)
+        self._directory = directory
+        self._flush_seconds = flush_seconds
+        self._path = None       # this process's file in `directory`
+        self._pid = None
+
+    def counter(self, name, help_text):
+        self._kinds[name] = ("counter", help_text, None)
+        self._values[name] = {}
+
+    def histogram(self, name, help_text, buckets=DURATION_BUCKETS):
+        self._kinds[name] = ("histogram", help_text, tuple(buckets))
+        self._values[name] = {}
+
+    def increment(self, name, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._values[name]
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        buckets = self._kinds[name][2]
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._values[name].get(key)
+            if series is None:
+                series = self._values[name][key] = [[0] * len(buckets), 0.0, 0]
+            index = bisect.bisect_left(buckets, value)
+            if index < len(buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def record_slow_query(self, statement, seconds, endpoint):
+        with self._lock:
+            self.slow_queries.append({
+                "endpoint": endpoint,
+                "seconds": round(seconds, 4),
+                "statement": " ".join(statement.split())[:500],
+                "at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            })
+
+    def start(self):
+        """Start writing this process's values to the shared directory, once per process."""
+        if self._directory is None or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # A new file per process lifetime: a recycled pid must not overwrite a dead worker's totals.
+            self._path = os.path.join(self._directory, f"{os.getpid()}-{uuid.uuid4().hex[:8]}.json")
+            self._pid = os.getpid()
+        os.makedirs(self._directory, exist_ok=True)
+        threading.Thread(target=self._flush_forever, name="metrics-flush", daemon=True).start()
+        atexit.register(self.flush)
+
+    def _flush_forever(self):
+        while True:
+            time.sleep(self._flush_seconds)
+            self.flush()
+
+    def _snapshot(self):
+        # Callers hold self._lock.
+        return {
+            "values": {
+                name: [[[list(pair) for pair in key], value] for key, value in series.items()]
+                for name, series in self._values.items()
+            },
+            "slow_queries": list(self.slow_queries),
+        }
+
+    def flush(self):
+        if self._path is None or self._pid != os.getpid():
+            return
+        with self._lock:
+            content = json.dumps(self._snapshot())
+        temp_path = f"{self._path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as out:
+            out.write(content)
+        os.replace(temp_path, self._path)
+
+    def _other_processes(self):
+        if self._directory is None or not os.path.isdir(self._directory):
+            return []
+        snapshots = []
+        for entry in os.scandir(self._directory):
+            if not entry.name.endswith(".json") or entry.path == self._path:
+                continue
+            try:
+                with open(entry.path, encoding="utf-8") as source:
+                    snapshots.append(json.load(source))
+            except (OSError, ValueError):
+                continue  # written by a worker that died mid-write; its .tmp never replaced it
+        return snapshots
+
+    def _merged(self):
+        # Callers hold self._lock; this process's values are live, the others' as last flushed.
+        merged = {name: {key: _copy(value) for key, value in series.items()} for name, series in self._values.items()}
+        slow = list(self.slow_queries)
+        for snapshot in self._other_processes():
+            for name, series in snapshot["values"].items():
+                if name not in merged:
+                    continue
+                for key, value in series:
+                    key = tuple(tuple(pair) for pair in key)
+                    merged[name][key] = _add(merged[name].get(key), value)
+            slow.extend(snapshot["slow_queries"])
+        return merged, sorted(slow, key=lambda sample: sample["at"])[-self.slow_queries.maxlen:]
+
+    def slow_query_samples(self):
+        """Recent slow queries from every process, oldest first."""
+        with self._lock:
+            return self._merged()[1]
+
+    def render(self, gauges=()):
+        """Return the exposition text; `gauges` is an iterable of (name, help, {label tuple: value})."""
+        lines = []
+        with self._lock:
+            values, _ = self._merged()
+            for name, (kind, help_text, buckets) in self._kinds.items():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for key, value in sorted(values[name].items(), key=lambda item: _sort_key(item[0])):
+                    if kind == "counter":
+                        lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+                        continue
+                    counts, total, count = value
+                    cumulative = 0
+                    for bound, bucket_count in zip(buckets, counts):
+                        cumulative += bucket_count
+                        lines.append(f"{name}_bucket{_format_labels(key, ('le', bound))} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(key, ('le', '+Inf'))} {count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {_format_value(total)}")
+                    lines.append(f"{name}_count{_format_labels(key)} {count}")
+        for name, help_text, series in gauges:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for key, value in sorted(series.items()):
+                lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,127 @@
+"""Lane policies and counter bookkeeping for the reporting halls.
+
+Waiting students sit in two lanes: X (fee paid, quick review) and Y
+(detailed consultation). When a counter frees up, a policy picks the lane
+whose oldest student is called next:
+
+- "fifo": whoever has waited longest, regardless of lane (the old
+  behaviour of a single queue ordered by booking).
+- "weighted": smooth weighted round-robin between the lanes, e.g. X:2,Y:1
+  calls two quick reviews for every detailed consultation.
+- "sej": shortest expected job first, using the measured mean service
+  time of each lane, but never letting a lane's oldest student wait
+  longer than `max_wait_seconds` once someone else could be called.
+
+Policies only see the arrival time of each lane's head, so the app can
+feed them from the database and the simulation from memory.
+"""
+from collections import deque
+
+LANES = ("X", "Y")
+
+
+def _waiting(heads):
+    return [lane for lane in LANES if heads.get(lane) is not None]
+
+
+class FifoPolicy:
+    name = "fifo"
+
+    def choose(self, heads, now):
+        """Return the lane to call from, given {lane: head arrival time or None}."""
+        waiting = _waiting(heads)
+        return min(waiting, key=lambda lane: heads[lane]) if waiting else None
+
+
+class WeightedRoundRobinPolicy:
+    name = "weighted"
+
+    def __init__(self, weights):
+        self.weights = {lane: weights.get(lane, 1) for lane in LANES}
+        self._current = {lane: 0 for lane in LANES}
+
+    def choose(self, heads, now):
+        waiting = _waiting(heads)
+        if not waiting:
+            return None
+        for lane in waiting:
+            self._current[lane] += self.weights[lane]
+        lane = max(waiting, key=lambda lane: self._current[lane])
+        self._current[lane] -= sum(self.weights[lane] for lane in waiting)
+        return lane
+
+
+class ShortestExpectedJobPolicy:
+    name = "sej"
+
+    def __init__(self, mean_seconds, max_wait_seconds=30 * 60):
+        self._mean_seconds = mean_seconds
+        self.max_wait_seconds = max_wait_seconds
+
+    def choose(self, heads, now):
+        waiting = _waiting(heads)
+        if not waiting:
+            return None
+        overdue = [lane for lane in waiting if now - heads[lane] >= self.max_wait_seconds]
+        if overdue:
+            return min(overdue, key=lambda lane: heads[lane])
+        return min(waiting, key=lambda lane: (self._mean_seconds(lane), heads[lane]))
+
+
+def make_policy(name, weights=None, mean_seconds=None, max_wait_seconds=30 * 60):
+    if name == "fifo":
+        return FifoPolicy()
+    if name == "weighted":
+        return WeightedRoundRobinPolicy(weights or {"X": 2, "Y": 1})
+    if name == "sej":
+        if mean_seconds is None:
+            raise ValueError("the sej policy needs mean service times")
+        return ShortestExpectedJobPolicy(mean_seconds, max_wait_seconds)
+    raise ValueError(f"unknown lane policy {name!r}")
+
+
+def parse_weights(spec):
+    """Parse "X:2,Y:1" into {"X": 2, "Y": 1}."""
+    weights = {}
+    for part in filter(None, (part.strip() for part in spec.split(","))):
+        lane, _, weight = part.partition(":")
+        weights[lane.strip().upper()] = int(weight)
+    return weights
+
+
+class Hall:
+    """In-memory lanes and counters for one hall.
+
+    The app keeps this state in the database instead; the simulation and
+    anything else that wants a self-contained queue can use this class.
+    """
+
+    def __init__(self, counters, policy):
+        self.policy = policy
+        self.lanes = {lane: deque() for lane in LANES}
+        self.serving = {counter: None for counter in counters}
+
+    def arrive(self, item, lane, at):
+        self.lanes[lane].append((at, item))
+
+    def waiting(self):
+        return sum(len(queue) for queue in self.lanes.values())
+
+    def free_counters(self):
+        return [counter for counter, current in self.serving.items() if current is None]
+
+    def call_next(self, counter, now):
+        """Assign the next student to a free counter; returns (lane, item, arrived_at) or None."""
+        if self.serving[counter] is not None:
+            raise ValueError(f"counter {counter} is still serving")
+        heads = {lane: queue[0][0] if queue else None for lane, queue in self.lanes.items()}
+        lane = self.policy.choose(heads, now)
+        if lane is None:
+            return None
+        arrived_at, item = self.lanes[lane].popleft()
+        self.serving[counter] = (lane, item)
+        return lane, item, arrived_at
+
+    def complete(self, counter):
+        finished, self.serving[counter] = self.serving[counter], None
+        return finished
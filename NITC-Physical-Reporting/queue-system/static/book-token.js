@@ -0,0 +1,312 @@
+const SLOT_POLL_MS = 5000;
+let selectedSlot = "";
+
+function formatHour(hour) {
+    if (hour === 0) return "12:00 AM";
+    if (hour < 12) return hour + ":00 AM";
+    if (hour === 12) return "12:00 PM";
+    return (hour - 12) + ":00 PM";
+}
+
+function requiredCapacityForFee(feeValue) {
+    return feeValue === "no" ? 2 : 1;
+}
+
+function renderSlots(feeValue = "") {
+    const slotGrid = document.getElementById("slotGrid");
+    const neededCapacity = requiredCapacityForFee(feeValue);
+    let html = "";
+    for (let i = 0; i < slotMeta.length; i += 1) {
+        const slotText = slotMeta[i].time;
+        const seats = slotMeta[i].capacity;
+        const isFull = seats < neededCapacity;
+        if (isFull && selectedSlot === slotText) {
+            selectedSlot = "";
+        }
+        const statusText = isFull
+            ? (feeValue === "no" ? `Need 2 tokens (only ${seats} left)` : "No seats left")
+            : (seats + " seats left");
+
+        html += `
+            <button type="button" class="slot-card text-left p-4 rounded-xl border border-slate-200 dark:border-slate-700 hover:border-primary transition ${isFull ? "opacity-60 cursor-not-allowed" : ""}" data-slot="${slotText}" ${isFull ? "disabled" : ""}>
+                <p class="font-bold">${slotText}</p>
+                <p class="text-xs ${isFull ? "text-red-600" : (seats > 3 ? "text-emerald-600" : "text-amber-600")}">${statusText}</p>
+            </button>
+        `;
+    }
+
+    slotGrid.innerHTML = html;
+    if (selectedSlot) {
+        const selectedCard = slotGrid.querySelector(`[data-slot="${selectedSlot}"]`);
+        if (selectedCard) {
+            selectedCard.classList.add("selected");
+        }
+    }
+}
+
+function updatePaymentModeVisibility(feeValue) {
+    const paidReceiptBox = document.getElementById("paidReceiptBox");
+    const paidReceiptUpload = document.getElementById("paidReceiptUpload");
+    const unpaidBox = document.getElementById("unpaidPaymentModes");
+    const unpaidInputs = document.querySelectorAll('input[name="unpaidMode"]');
+
+    if (feeValue === "yes") {
+        paidReceiptBox.classList.remove("hidden");
+    } else {
+        paidReceiptBox.classList.add("hidden");
+        paidReceiptUpload.value = "";
+    }
+
+    if (feeValue === "no") {
+        unpaidBox.classList.remove("hidden");
+        return;
+    }
+
+    unpaidBox.classList.add("hidden");
+    unpaidInputs.forEach((input) => {
+        input.checked = false;
+    });
+}
+
+if (email) {
+    const base = email.split("@")[0];
+    const parts = base.split("_");
+    if (parts.length === 2) {
+        const name = parts[0].charAt(0).toUpperCase() + parts[0].slice(1);
+        const roll = parts[1].toUpperCase();
+        document.getElementById("studentName").innerText = name;
+        document.getElementById("studentRoll").innerText = "Roll: " + roll;
+    }
+}
+
+function updateProgress() {
+    const feeValue = document.querySelector('input[name="fee"]:checked')?.value || "";
+    const feePicked = feeValue !== "";
+    const feePaid = feeValue === "yes";
+    const unpaidMode = document.querySelector('input[name="unpaidMode"]:checked')?.value || "";
+    const unpaidModeDone = unpaidMode !== "";
+    const paidReceiptDone = !!document.getElementById("paidReceiptUpload").files.length;
+    const feeStepDone = feePaid ? paidReceiptDone : (feePicked && unpaidModeDone);
+    const docsDone = !!document.getElementById("docClass10").files.length && !!document.getElementById("docClass12").files.length;
+
+    updatePaymentModeVisibility(feeValue);
+    renderSlots(feeValue);
+    bindSlotSelection();
+    const slotDone = !!selectedSlot;
+
+    let done = 0;
+    if (feeStepDone) done += 1;
+    if (docsDone) done += 1;
+    if (slotDone) done += 1;
+
+    const percent = Math.round((done / 3) * 100);
+    document.getElementById("progressBar").style.width = percent + "%";
+    document.getElementById("progressText").innerText = percent + "% Complete";
+
+    document.getElementById("feeStatus").innerText = feePaid ? "Paid" : (feePicked ? "Not Paid" : "Pending");
+    document.getElementById("paymentModeStatus").innerText = feePaid ? "NA" : (unpaidMode === "on-spot" ? "On Spot Payment" : (unpaidMode === "education-loan" ? "Education Loan" : "Pending"));
+    document.getElementById("receiptStatus").innerText = feePaid ? (paidReceiptDone ? "Uploaded" : "Pending") : "NA";
+    document.getElementById("documentsStatus").innerText = docsDone ? "Completed" : "Pending";
+    document.getElementById("slotStatus").innerText = slotDone ? selectedSlot : "Not Selected";
+
+    document.querySelectorAll(".token-step").forEach((step, idx) => {
+        const threshold = idx + 1;
+        step.classList.toggle("active", done >= threshold - 1);
+    });
+}
+
+document.querySelectorAll('input[name="fee"]').forEach((input) => {
+    input.addEventListener("change", updateProgress);
+});
+
+document.querySelectorAll('input[name="unpaidMode"]').forEach((input) => {
+    input.addEventListener("change", updateProgress);
+});
+document.getElementById("paidReceiptUpload").addEventListener("change", updateProgress);
+document.querySelectorAll(".document-input").forEach((input) => {
+    input.addEventListener("change", updateProgress);
+});
+
+function bindSlotSelection() {
+    document.querySelectorAll(".slot-card").forEach((card) => {
+        card.addEventListener("click", () => {
+            document.querySelectorAll(".slot-card").forEach((c) => c.classList.remove("selected"));
+            card.classList.add("selected");
+            selectedSlot = card.dataset.slot || "";
+            updateProgress();
+        });
+    });
+}
+
+// document.getElementById("submitBooking").addEventListener("click", () => {
+//     const feeValue = document.querySelector('input[name="fee"]:checked')?.value || "";
+//     const feePicked = feeValue !== "";
+//     const feePaid = feeValue === "yes";
+//     const unpaidMode = document.querySelector('input[name="unpaidMode"]:checked')?.value || "";
+//     const paidReceiptDone = !!document.getElementById("paidReceiptUpload").files.length;
+//     const docsDone = !!document.getElementById("docClass10").files.length && !!document.getElementById("docClass12").files.length;
+//     const slotDone = !!selectedSlot;
+
+//     if (!feePicked) {
+//         alert("Please select fee status first.");
+//         return;
+//     }
+
+//     if (feePaid && !paidReceiptDone) {
+//         alert("Please upload the fee receipt.");
+//         return;
+//     }
+
+//     if (!feePaid && !unpaidMode) {
+//         alert("Please select payment mode: On Spot Payment or Education Loan.");
+//         return;
+//     }
+
+//     if (!docsDone || !slotDone) {
+//         alert("Please complete mandatory document uploads (Class 10 and Class 12) and slot selection.");
+//         return;
+//     }
+//     window.location.href = "/success-token.html";
+
+//     // alert("Token booked successfully for " + selectedSlot + "!");
+// });
+
+// document.getElementById("submitBooking").addEventListener("click", async () => {
+
+//     const feeValue = document.querySelector('input[name="fee"]:checked')?.value;
+//     const paymentMode = document.querySelector('input[name="unpaidMode"]:checked')?.value || "";
+
+//     if (!selectedSlot) {
+//         alert("Select slot");
+//         return;
+//     }
+
+//     const res = await fetch("/submit-booking", {
+//         method: "POST",
+//         headers: { "Content-Type": "application/json" },
+//         body: JSON.stringify({
+//             slot: selectedSlot,
+//             fee: feeValue,
+//             payment: paymentMode
+//         })
+//     });
+
+//     const data = await res.json();
+
+//     if (data.success) {
+//         window.location = data.redirect;
+//     }
+// });
+
+document.getElementById("submitBooking").addEventListener("click", async () => {
+    if (existingBooking) {
+        alert("You already booked a slot and cannot book again.");
+        return;
+    }
+
+    const feeValue = document.querySelector('input[name="fee"]:checked')?.value || "";
+    const feePicked = feeValue !== "";
+    const feePaid = feeValue === "yes";
+
+    const unpaidMode = document.querySelector('input[name="unpaidMode"]:checked')?.value || "";
+    const paidReceiptDone = !!document.getElementById("paidReceiptUpload").files.length;
+
+    const docsDone =
+        !!document.getElementById("docClass10").files.length &&
+        !!document.getElementById("docClass12").files.length;
+
+    const slotDone = !!selectedSlot;
+
+    // -------- VALIDATIONS --------
+
+    if (!feePicked) {
+        alert("Please select fee status first.");
+        return;
+    }
+
+    if (feePaid && !paidReceiptDone) {
+        alert("Please upload the fee receipt.");
+        return;
+    }
+
+    if (!feePaid && !unpaidMode) {
+        alert("Please select payment mode: On Spot Payment or Education Loan.");
+        return;
+    }
+
+    if (!docsDone) {
+        alert("Upload Class 10 and Class 12 documents.");
+        return;
+    }
+
+    if (!slotDone) {
+        alert("Please select a time slot.");
+        return;
+    }
+
+    // -------- SEND TO BACKEND --------
+
+    const res = await fetch("/submit-booking", {
+        method: "POST",
+        body: (() => {
+            const fd = new FormData();
+            fd.append("slot", selectedSlot);
+            fd.append("fee", feeValue);
+            fd.append("payment", unpaidMode);
+            fd.append("docClass10", document.getElementById("docClass10").files[0]);
+            fd.append("docClass12", document.getElementById("docClass12").files[0]);
+            const catDoc = document.getElementById("docCategory").files[0];
+            if (catDoc) {
+                fd.append("docCategory", catDoc);
+            }
+            const receipt = document.getElementById("paidReceiptUpload").files[0];
+            if (receipt) {
+                fd.append("paidReceipt", receipt);
+            }
+            return fd;
+        })()
+    });
+
+    const data = await res.json();
+
+    // -------- HANDLE RESPONSE --------
+
+    if (!data.success) {
+        alert(data.message || "Booking failed");
+        return;
+    }
+
+    // SUCCESS
+    window.location.href = data.redirect;
+});
+
+
+
+// Refresh seat counts while the page is open; an unchanged ETag comes back as an empty 304.
+async function pollSlots() {
+    if (document.hidden) return;
+    try {
+        const res = await fetch("/api/slots", {
+            cache: "no-store",
+            headers: slotsEtag ? { "If-None-Match": slotsEtag } : {},
+        });
+        if (res.status !== 200) return;
+        const data = await res.json();
+        slotsEtag = res.headers.get("ETag");
+        slotMeta.splice(0, slotMeta.length, ...data.slots);
+        updateProgress();
+    } catch (err) {
+        // Keep showing the last known counts; the next poll retries.
+    }
+}
+
+renderSlots();
+bindSlotSelection();
+updateProgress();
+if (existingBooking) {
+    document.getElementById("submitBooking").disabled = true;
+    document.getElementById("submitBooking").classList.add("opacity-60", "cursor-not-allowed");
+} else {
+    setInterval(pollSlots, SLOT_POLL_MS);
+    document.addEventListener("visibilitychange", pollSlots);
+}
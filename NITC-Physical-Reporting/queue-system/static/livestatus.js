@@ -0,0 +1,86 @@
+(function () {
+  // Polling interval when no stream is available (refused, disabled or unsupported).
+  const POLL_MS = 15000;
+
+  const state = Object.assign({}, window.LIVE_STATUS);
+  const nowServing = document.getElementById("now-serving-token");
+  const upcoming = document.getElementById("upcoming-tokens");
+  const studentsAhead = document.getElementById("students-ahead");
+  const expectedTime = document.getElementById("expected-time-minutes");
+  const updatedLabel = document.getElementById("updated-label");
+
+  function renderUpcoming(tokens) {
+    upcoming.replaceChildren();
+    const labels = tokens.length ? tokens : ["No Upcoming Tokens"];
+    labels.forEach((token, index) => {
+      const chip = document.createElement("span");
+      const highlight = tokens.length && index === 0;
+      chip.className = `px-3 py-2 ${highlight ? "bg-primary/10 text-primary" : "bg-slate-100 dark:bg-slate-800"} rounded-lg font-bold text-base sm:text-lg`;
+      chip.textContent = token;
+      upcoming.appendChild(chip);
+    });
+  }
+
+  function renderAhead() {
+    studentsAhead.textContent = state.xCount + state.yCount;
+    expectedTime.textContent = Math.ceil(state.quickMinutes * state.xCount + state.detailedMinutes * state.yCount);
+  }
+
+  function onQueueEvent(event) {
+    const data = JSON.parse(event.data);
+    nowServing.textContent = data.now_serving_token;
+    renderUpcoming(data.upcoming_tokens || []);
+    updatedLabel.textContent = new Date().toLocaleTimeString();
+
+    if (state.bookingId === null) return;
+    if (data.booking_id === state.bookingId) {
+      // Our own booking changed state; the page content no longer applies.
+      window.location.reload();
+      return;
+    }
+    const leftWaitingQueue =
+      event.type === "booking-moved" || (event.type === "booking-removed" && !data.sent_to_chanakya);
+    if (leftWaitingQueue && data.booking_id < state.bookingId) {
+      if (data.queue === "X") state.xCount = Math.max(0, state.xCount - 1);
+      else state.yCount = Math.max(0, state.yCount - 1);
+      renderAhead();
+    }
+  }
+
+  async function poll() {
+    try {
+      const res = await fetch("/queue/status", { credentials: "same-origin" });
+      if (res.ok) {
+        const data = await res.json();
+        if (state.bookingId !== null && data.booking_id !== state.bookingId) {
+          window.location.reload();
+          return;
+        }
+        nowServing.textContent = data.now_serving_token;
+        renderUpcoming(data.upcoming_tokens);
+        studentsAhead.textContent = data.students_ahead;
+        expectedTime.textContent = data.expected_time_minutes;
+        state.xCount = data.x_count;
+        state.yCount = data.y_count;
+        updatedLabel.textContent = new Date().toLocaleTimeString();
+      }
+    } catch (error) {
+      // Try again on the next tick.
+    }
+    window.setTimeout(poll, POLL_MS);
+  }
+
+  if (!window.EventSource) {
+    window.setTimeout(poll, POLL_MS);
+    return;
+  }
+  const source = new EventSource("/queue/stream");
+  ["booking-added", "booking-moved", "booking-removed"].forEach((name) => {
+    source.addEventListener(name, onQueueEvent);
+  });
+  source.addEventListener("resync", () => window.location.reload());
+  source.addEventListener("error", () => {
+    // CLOSED means the server refused the stream (204), not a dropped connection.
+    if (source.readyState === EventSource.CLOSED) window.setTimeout(poll, POLL_MS);
+  });
+})();
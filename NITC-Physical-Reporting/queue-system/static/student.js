@@ -0,0 +1,123 @@
+if (email) {
+
+    // Remove domain
+    let base = email.split("@")[0];
+
+    // Split name & roll
+    let parts = base.split("_");
+
+    if (parts.length === 2) {
+
+        let name = parts[0];
+        let roll = parts[1];
+
+        // Format
+        name = name.charAt(0).toUpperCase() + name.slice(1);
+        roll = roll.toUpperCase();
+
+        // Set navbar
+        document.getElementById("studentName").innerText = name;
+        document.getElementById("studentRoll").innerText = "Roll: " + roll;
+
+    }
+
+}
+
+
+
+document.addEventListener("DOMContentLoaded", () => {
+
+    const hoursEl = document.getElementById("hours");
+    const minsEl = document.getElementById("mins");
+    const secsEl = document.getElementById("secs");
+    const btn = document.getElementById("bookBtn");
+    const bookingHint = document.getElementById("bookingHint");
+
+    if (!hoursEl || !minsEl || !secsEl || !btn) {
+        return;
+    }
+
+    // 👉 Change for testing
+    const bookingHour = 21; // 5PM
+
+
+
+    function enableBooking() {
+        btn.disabled = false;
+        btn.innerHTML = "Book Token Now";
+
+        btn.classList.remove(
+            "cursor-not-allowed",
+            "text-slate-500",
+            "bg-slate-200",
+            "dark:bg-slate-800"
+        );
+
+        btn.classList.add(
+            "bg-orange-500",
+            "hover:bg-orange-600",
+            "text-white",
+            "cursor-pointer"
+        );
+
+        localStorage.setItem("bookingOpen", "true");
+    }
+
+    function enableLiveStatus() {
+        btn.disabled = false;
+        btn.innerHTML = '<span class="material-symbols-outlined">monitoring</span> View Live Status';
+        btn.classList.remove(
+            "cursor-not-allowed",
+            "text-slate-500",
+            "bg-slate-200",
+            "dark:bg-slate-800"
+        );
+        btn.classList.add(
+            "bg-emerald-600",
+            "hover:bg-emerald-700",
+            "text-white",
+            "cursor-pointer"
+        );
+        if (bookingHint) {
+            bookingHint.innerText = "You have already booked a token. Track your reporting queue in real time.";
+        }
+    }
+
+    function updateTimer() {
+
+        const now = new Date();
+        const target = new Date();
+        target.setHours(bookingHour, 25, 0, 0);
+
+        const diff = target - now;
+
+        if (diff <= 0) {
+            enableBooking();
+            return;
+        }
+
+        const h = Math.floor(diff / 3600000);
+        const m = Math.floor((diff % 3600000) / 60000);
+        const s = Math.floor((diff % 60000) / 1000);
+
+        hoursEl.innerText = String(h).padStart(2, '0');
+        minsEl.innerText = String(m).padStart(2, '0');
+        secsEl.innerText = String(s).padStart(2, '0');
+    }
+
+    if (hasBooking) {
+        enableLiveStatus();
+    } else if (localStorage.getItem("bookingOpen") === "true") {
+        enableBooking();
+    } else {
+        updateTimer();
+        setInterval(updateTimer, 1000);
+    }
+
+    btn.onclick = () => {
+        if (!btn.disabled) {
+            window.location.href = hasBooking ? "/livestatus.html" : "/book-token.html";
+        }
+    }
+
+});
@@ -0,0 +1,39 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+QUEUE_SYSTEM_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, QUEUE_SYSTEM_DIR)
+
+# app.py reads its configuration on import, so point it at scratch storage first.
+_scratch = tempfile.mkdtemp(prefix="queue-system-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_scratch, 'test.db')}"
+os.environ["UPLOAD_DIR"] = os.path.join(_scratch, "uploads")
+os.environ.setdefault("PASSWORD_HASH_METHOD", "pbkdf2:sha256:1000")
+os.environ.setdefault("LOGIN_IP_BURST", "1000")
+
+
+@pytest.fixture(scope="session")
+def queue_app():
+    import app as queue_app
+
+    queue_app.app.config["TESTING"] = True
+    with queue_app.app.app_context():
+        queue_app.init_database()
+    return queue_app
+
+
+@pytest.fixture
+def fresh_bookings(queue_app):
+    """Empty the bookings and restore every slot to full capacity."""
+    with queue_app.app.app_context():
+        queue_app.TokenBooking.query.execution_options(include_rejected=True).delete()
+        queue_app.ArchivedBooking.query.delete()
+        queue_app.StoredDocument.query.delete()
+        queue_app.Slot.query.update({queue_app.Slot.capacity: 40})
+        queue_app.db.session.commit()
+        queue_app.queue_index.invalidate()
+        queue_app.slot_availability.refresh()
+    return queue_app
@@ -0,0 +1,43 @@
+import assets
+
+
+def build_version(source, output, text, keep_builds=3):
+    (source / "app.js").write_text(text)
+    built = assets.build(str(source), str(output), keep_builds=keep_builds)
+    return built["app.js"][0]
+
+
+def test_previous_builds_stay_servable_until_they_age_out(tmp_path):
+    source, output = tmp_path / "static", tmp_path / "dist"
+    source.mkdir()
+    manifest = assets.AssetManifest(str(output))
+
+    first = build_version(source, output, "console.log(1);\n" * 50)
+    second = build_version(source, output, "console.log(2);\n" * 50)
+
+    assert manifest.lookup("app.js") == second
+    assert (output / first).is_file()
+    assert "identity" in manifest.encodings(first)
+    assert "gzip" in manifest.encodings(first)
+
+    third = build_version(source, output, "console.log(3);\n" * 50)
+    fourth = build_version(source, output, "console.log(4);\n" * 50)
+
+    assert not (output / first).exists()
+    assert not (output / (first + ".gz")).exists()
+    assert manifest.encodings(first) == set()
+    assert all((output / name).is_file() for name in (second, third, fourth))
+    assert manifest.lookup("app.js") == fourth
+
+
+def test_rebuilding_unchanged_sources_keeps_the_older_builds(tmp_path):
+    source, output = tmp_path / "static", tmp_path / "dist"
+    source.mkdir()
+
+    first = build_version(source, output, "a", keep_builds=2)
+    second = build_version(source, output, "b", keep_builds=2)
+    for _ in range(3):
+        build_version(source, output, "b", keep_builds=2)
+
+    assert (output / first).is_file()
+    assert (output / second).is_file()
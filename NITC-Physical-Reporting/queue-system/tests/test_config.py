@@ -0,0 +1,9 @@
+def test_connection_pool_has_a_connection_per_request_thread(queue_app):
+    for url in ("postgresql://user:pass@db/nitc", "sqlite:////srv/nitc/users.db"):
+        options = queue_app.engine_options(url)
+        assert options["pool_size"] == queue_app.WORKER_THREADS
+        assert options["max_overflow"] > 0
+
+
+def test_in_memory_sqlite_keeps_its_default_pool(queue_app):
+    assert "pool_size" not in queue_app.engine_options("sqlite://")
@@ -0,0 +1,114 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from estimator import ServiceTimeEstimator
+
+START = datetime(2026, 7, 1, 9, 0)
+
+
+def at(seconds):
+    return START + timedelta(seconds=seconds)
+
+
+def test_mean_converges_to_a_steady_service_time():
+    estimator = ServiceTimeEstimator({"X": 600}, alpha=0.2)
+    previous = at(0)
+    for _ in range(60):
+        departed = previous + timedelta(seconds=120)
+        estimator.record_departure("X", START, previous, departed)
+        previous = departed
+
+    assert estimator.snapshot()["X"] == {"mean_seconds": 120.0, "samples": 60}
+
+
+def test_each_sample_moves_the_mean_by_alpha():
+    estimator = ServiceTimeEstimator({"X": 600}, alpha=0.25)
+    estimator.record_departure("X", START, at(0), at(200))
+
+    assert estimator.snapshot()["X"]["mean_seconds"] == pytest.approx(600 + 0.25 * (200 - 600))
+
+
+def test_idle_desk_gap_is_measured_from_arrival():
+    estimator = ServiceTimeEstimator({"X": 600}, alpha=1.0)
+    # The desk was idle from 0 until the student arrived at 1000.
+    estimator.record_departure("X", at(1000), at(0), at(1090))
+
+    assert estimator.snapshot()["X"]["mean_seconds"] == 90.0
+
+
+def test_busy_desk_gap_is_measured_from_previous_departure():
+    estimator = ServiceTimeEstimator({"X": 600}, alpha=1.0)
+    estimator.record_departure("X", at(0), at(500), at(650))
+
+    assert estimator.snapshot()["X"]["mean_seconds"] == 150.0
+
+
+@pytest.mark.parametrize("arrived, previous, departed", [
+    (0, 500, 400),    # negative gap, e.g. clock skew
+    (0, 500, 500),    # zero gap
+    (0, 0, 3601),     # longer than max_sample_seconds, e.g. a desk break
+    (0, None, 300),   # nothing to measure from
+])
+def test_unusable_samples_are_discarded(arrived, previous, departed):
+    estimator = ServiceTimeEstimator({"X": 600}, max_sample_seconds=3600)
+    estimator.record_departure("X", at(arrived), None if previous is None else at(previous), at(departed))
+
+    assert estimator.snapshot()["X"] == {"mean_seconds": 600, "samples": 0}
+
+
+def test_replay_orders_departures_and_chains_previous_departure():
+    estimator = ServiceTimeEstimator({"X": 600, "Y": 1200}, alpha=1.0)
+    estimator.replay([
+        ("Y", at(0), at(400)),
+        ("X", at(0), at(100)),
+        ("X", at(0), at(160)),
+    ])
+
+    # The first departure has nothing to measure from; then 100->160 (X) and 160->400 (Y).
+    assert estimator.snapshot() == {
+        "X": {"mean_seconds": 60.0, "samples": 1},
+        "Y": {"mean_seconds": 240.0, "samples": 1},
+    }
+
+
+def test_loader_history_is_not_counted_twice():
+    history = [("X", at(0), at(100)), ("X", at(0), at(200))]
+    estimator = ServiceTimeEstimator({"X": 600}, alpha=1.0, loader=lambda: history)
+
+    # The same departure reported live after the loader already replayed it.
+    estimator.record_departure("X", at(0), at(100), at(200))
+    assert estimator.snapshot()["X"] == {"mean_seconds": 100.0, "samples": 1}
+
+    estimator.record_departure("X", at(0), at(200), at(230))
+    assert estimator.snapshot()["X"] == {"mean_seconds": 30.0, "samples": 2}
+
+
+def test_loader_runs_once():
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return []
+
+    estimator = ServiceTimeEstimator({"X": 600}, loader=loader)
+    estimator.mean_minutes("X")
+    estimator.expected_minutes({"X": 2})
+
+    assert calls == [1]
+
+
+def test_expected_minutes_rounds_up():
+    estimator = ServiceTimeEstimator({"X": 90, "Y": 600})
+
+    assert estimator.expected_minutes({"X": 1, "Y": 1}) == 12
+
+
+def test_reset_restores_priors_and_forgets_history():
+    estimator = ServiceTimeEstimator({"X": 600}, alpha=1.0)
+    estimator.replay([("X", at(0), at(100)), ("X", at(0), at(200))])
+    estimator.reset()
+
+    assert estimator.snapshot()["X"] == {"mean_seconds": 600, "samples": 0}
+    estimator.record_departure("X", at(0), at(0), at(50))
+    assert estimator.snapshot()["X"]["mean_seconds"] == 50.0
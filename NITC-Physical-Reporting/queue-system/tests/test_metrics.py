@@ -0,0 +1,81 @@
+import pytest
+
+from metrics import MetricsRegistry
+
+
+def registry(directory):
+    metrics = MetricsRegistry(directory=str(directory), flush_seconds=3600)
+    metrics.counter("requests_total", "Requests.")
+    metrics.histogram("request_seconds", "Latency.", buckets=(0.1, 1))
+    return metrics
+
+
+def test_render_adds_up_every_worker(tmp_path):
+    # Two registries stand in for two worker processes sharing the directory.
+    first, second = registry(tmp_path), registry(tmp_path)
+    first.start()
+    second.start()
+    first.increment("requests_total", status=200)
+    first.observe("request_seconds", 0.05)
+    second.increment("requests_total", 2, status=200)
+    second.increment("requests_total", status=500)
+    second.observe("request_seconds", 0.5)
+    first.flush()
+    second.flush()
+
+    for scraped in (first, second):
+        text = scraped.render()
+        assert 'requests_total{status="200"} 3' in text
+        assert 'requests_total{status="500"} 1' in text
+        assert 'request_seconds_bucket{le="0.1"} 1' in text
+        assert 'request_seconds_bucket{le="1"} 2' in text
+        assert "request_seconds_count 2" in text
+
+
+def test_totals_of_an_exited_worker_are_kept(tmp_path):
+    exited, live = registry(tmp_path), registry(tmp_path)
+    exited.start()
+    exited.increment("requests_total", 5, status=200)
+    exited.flush()
+    live.start()
+    live.increment("requests_total", status=200)
+
+    assert 'requests_total{status="200"} 6' in live.render()
+
+
+def test_requests_that_raise_are_counted_as_500(queue_app, monkeypatch, tmp_path):
+    metrics = queue_app.MetricsRegistry()
+    metrics.histogram("nitc_request_seconds", "")
+    metrics.counter("nitc_requests_total", "")
+    metrics.histogram("nitc_request_queries", "", buckets=queue_app.COUNT_BUCKETS)
+    metrics.counter("nitc_query_seconds_total", "")
+    monkeypatch.setattr(queue_app, "metrics", metrics)
+    app = queue_app.app
+    monkeypatch.setitem(app.before_request_funcs, None, [queue_app._start_request_metrics])
+    monkeypatch.setitem(app.after_request_funcs, None, [queue_app._note_response_status])
+    monkeypatch.setitem(app.teardown_request_funcs, None, [queue_app._finish_request_metrics])
+
+    def broken():
+        raise RuntimeError("boom")
+
+    monkeypatch.setitem(app.view_functions, "slots_api", broken)
+    with pytest.raises(RuntimeError):
+        app.test_client().get("/api/slots")
+
+    assert 'nitc_requests_total{endpoint="slots_api",method="GET",status="500"} 1' in metrics.render()
+
+
+def test_query_timer_is_unwound_when_a_statement_fails(queue_app):
+    with queue_app.app.app_context():
+        connection = queue_app.db.session.connection()
+        connection.info["metrics_query_started"] = []
+        queue_app.event.listen(queue_app.Engine, "before_cursor_execute", queue_app._start_query_timer)
+        queue_app.event.listen(queue_app.Engine, "handle_error", queue_app._abandon_query_timer)
+        try:
+            with pytest.raises(Exception):
+                connection.exec_driver_sql("SELECT * FROM no_such_table")
+        finally:
+            queue_app.event.remove(queue_app.Engine, "before_cursor_execute", queue_app._start_query_timer)
+            queue_app.event.remove(queue_app.Engine, "handle_error", queue_app._abandon_query_timer)
+        assert connection.info["metrics_query_started"] == []
+        queue_app.db.session.rollback()
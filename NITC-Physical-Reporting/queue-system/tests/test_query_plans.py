@@ -0,0 +1,14 @@
+def test_hot_queries_use_indexes_with_the_soft_delete_filter(queue_app):
+    result = queue_app.app.test_cli_runner().invoke(args=["check-query-plans"])
+
+    assert result.exit_code == 0, result.output
+    assert "rejected_at IS NULL" not in result.output
+    departure = next(line for line in result.output.splitlines() if "last desk departure" in line)
+    assert "ix_token_booking_sent_at" in departure
+
+
+def test_explained_sql_includes_the_soft_delete_filter(queue_app):
+    with queue_app.app.app_context():
+        statement, _ = queue_app.executed_sql(queue_app.HOT_QUERIES["last desk departure"])
+
+    assert "rejected_at IS NULL" in statement
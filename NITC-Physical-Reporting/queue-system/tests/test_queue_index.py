@@ -0,0 +1,79 @@
+import random
+from datetime import datetime
+
+import pytest
+
+SLOT = "9:00 AM - 10:00 AM"
+
+
+def expected_status(queue_app, email):
+    """What QueueIndex.status_for should report, counted straight from the bookings table."""
+    TokenBooking = queue_app.TokenBooking
+    waiting = TokenBooking.query.filter_by(sent_to_chanakya=False)
+    booking = waiting.filter_by(student_email=email).order_by(TokenBooking.id).first()
+    if booking is None:
+        return None, 0, 0
+    ahead = [fee for (fee,) in waiting.filter(TokenBooking.id < booking.id).with_entities(TokenBooking.fee_status)]
+    x_count = sum(1 for fee in ahead if (fee or "").lower() == "yes")
+    return booking.id, x_count, len(ahead) - x_count
+
+
+def expected_depth(queue_app):
+    fees = [fee for (fee,) in queue_app.TokenBooking.query.filter_by(sent_to_chanakya=False)
+            .with_entities(queue_app.TokenBooking.fee_status)]
+    quick = sum(1 for fee in fees if (fee or "").lower() == "yes")
+    return {"X": quick, "Y": len(fees) - quick}
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_index_matches_count_queries_through_random_changes(fresh_bookings, seed):
+    queue_app = fresh_bookings
+    TokenBooking, db = queue_app.TokenBooking, queue_app.db
+    rng = random.Random(seed)
+    index = queue_app.QueueIndex()
+    index.COMPACT_THRESHOLD = 8
+    emails = [f"student{n}@nitc.ac.in" for n in range(150)]
+
+    with queue_app.app.app_context():
+        for step in range(300):
+            waiting = TokenBooking.query.filter_by(sent_to_chanakya=False).all()
+            live_emails = {b.student_email for b in TokenBooking.query}
+            free = [email for email in emails if email not in live_emails]
+            # Fill the queue first, then mostly drain it so that the index also compacts.
+            local = ["add", "add", "proceed"] if step < 150 else ["add", "proceed", "proceed", "reject"]
+            operation = rng.choice(local * 3 + ["other worker"])
+            # This worker applies its own changes to the index in place; another worker's
+            # changes only bump the queue version, and the next read has to reload.
+            applied = operation != "other worker"
+            if operation == "other worker":
+                operation = rng.choice(["add", "proceed", "reject"])
+
+            if operation == "add" and free:
+                booking = TokenBooking(
+                    student_email=rng.choice(free), slot_time=SLOT, token_id=f"T-{step}",
+                    fee_status=rng.choice(["yes", "Yes", "no", None]), booked_at=datetime.now(),
+                )
+                db.session.add(booking)
+                db.session.flush()
+                version = queue_app.bump_queue_version()
+                db.session.commit()
+                if applied:
+                    index.add(booking, version)
+            elif operation in ("proceed", "reject") and waiting:
+                booking = rng.choice(waiting)
+                if operation == "proceed":
+                    booking.sent_to_chanakya = True
+                else:
+                    booking.rejected_at = datetime.now()
+                version = queue_app.bump_queue_version()
+                db.session.commit()
+                if applied:
+                    index.remove(booking.id, version)
+
+            assert index.depth() == expected_depth(queue_app)
+            head = TokenBooking.query.filter_by(sent_to_chanakya=False).order_by(TokenBooking.id).first()
+            assert index.status_for(None)["now_serving_token"] == (head.token_id if head else "--")
+            for email in rng.sample(emails, 5):
+                status = index.status_for(email)
+                booking_id, x_count, y_count = expected_status(queue_app, email)
+                assert (status["booking_id"], status["x_count"], status["y_count"]) == (booking_id, x_count, y_count)
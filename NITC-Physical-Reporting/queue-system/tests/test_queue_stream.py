@@ -0,0 +1,62 @@
+def test_disabled_stream_tells_the_browser_not_to_reconnect(queue_app, monkeypatch):
+    monkeypatch.setattr(queue_app, "QUEUE_STREAM_ENABLED", False)
+
+    response = queue_app.app.test_client().get("/queue/stream")
+
+    assert response.status_code == 204
+    assert not queue_app.queue_events._subscribers
+
+
+def test_streams_beyond_the_limit_are_refused_and_requests_still_served(queue_app, monkeypatch):
+    monkeypatch.setattr(queue_app.queue_events, "_limit", 3)
+    client = queue_app.app.test_client()
+
+    streams = [client.get("/queue/stream", buffered=False) for _ in range(5)]
+    try:
+        assert [stream.status_code for stream in streams] == [200, 200, 200, 204, 204]
+
+        status = client.get("/queue/status")
+        assert status.status_code == 200
+        assert "now_serving_token" in status.get_json()
+        assert client.get("/api/slots").status_code == 200
+
+        with client.session_transaction() as session:
+            session["admin_email"] = "jimmy@nitc.ac.in"
+        admin_stream = client.get("/queue/stream", buffered=False)
+        assert admin_stream.status_code == 200
+        streams.append(admin_stream)
+    finally:
+        for stream in streams:
+            stream.close()
+
+    assert not queue_app.queue_events._subscribers
+    reopened = client.get("/queue/stream", buffered=False)
+    assert reopened.status_code == 200
+    reopened.close()
+
+
+def test_no_events_are_stored_while_streaming_is_disabled(fresh_bookings, monkeypatch):
+    queue_app = fresh_bookings
+    monkeypatch.setattr(queue_app, "QUEUE_STREAM_ENABLED", False)
+    with queue_app.app.app_context():
+        before = queue_app.QueueEvent.query.count()
+        booking = queue_app.TokenBooking(student_email="quiet@nitc.ac.in", token_id="T-QUIET", fee_status="yes")
+        queue_app.publish_queue_event("booking-added", booking)
+
+        assert queue_app.QueueEvent.query.count() == before
+
+
+def test_old_events_are_pruned_without_subscribers(queue_app):
+    with queue_app.app.app_context():
+        now = queue_app.datetime.now()
+        queue_app.db.session.add_all([
+            queue_app.QueueEvent(event="booking-added", public="{}", created_at=now - queue_app.timedelta(hours=2)),
+            queue_app.QueueEvent(event="booking-added", public="{}", created_at=now),
+        ])
+        queue_app.db.session.commit()
+
+        assert queue_app.prune_queue_events() >= 1
+        assert queue_app.QueueEvent.query.filter(
+            queue_app.QueueEvent.created_at < now - queue_app.QUEUE_EVENT_RETENTION
+        ).count() == 0
+        assert queue_app.QueueEvent.query.filter_by(created_at=now).count() == 1
@@ -0,0 +1,40 @@
+import io
+
+import click
+import pytest
+
+
+def test_roster_ignores_extra_fields_and_skips_incomplete_rows(queue_app):
+    roster = io.StringIO(
+        "Email,Password\n"
+        "a@nitc.ac.in,one,\n"
+        "b@nitc.ac.in,two,extra,fields\n"
+        "c@nitc.ac.in\n"
+        "not-an-email,three\n"
+        "A@nitc.ac.in,four\n"
+    )
+
+    batches = list(queue_app.read_roster_batches(roster, batch_size=10))
+
+    assert batches == [[("a@nitc.ac.in", "four"), ("b@nitc.ac.in", "two")]]
+
+
+def test_roster_without_password_column_is_rejected(queue_app):
+    with pytest.raises(click.ClickException, match="password"):
+        list(queue_app.read_roster_batches(io.StringIO("email\na@nitc.ac.in\n"), batch_size=10))
+
+
+def test_imported_student_can_log_in_with_the_roster_capitals(queue_app, tmp_path):
+    roster = tmp_path / "roster.csv"
+    roster.write_text("email,password\nMixed.Case_B250001EC@NITC.ac.in,secret1\n", encoding="utf-8")
+
+    result = queue_app.app.test_cli_runner().invoke(
+        args=["import-students", str(roster), "--workers", "1"]
+    )
+    assert result.exit_code == 0, result.output
+
+    for typed in ("Mixed.Case_B250001EC@NITC.ac.in", "mixed.case_b250001ec@nitc.ac.in"):
+        response = queue_app.app.test_client().post(
+            "/login", json={"role": "student", "email": typed, "password": "secret1"}
+        )
+        assert response.get_json()["success"], typed
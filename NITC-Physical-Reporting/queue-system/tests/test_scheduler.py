@@ -0,0 +1,96 @@
+import argparse
+import os
+import random
+import sys
+
+import pytest
+
+from scheduler import (
+    FifoPolicy, Hall, ShortestExpectedJobPolicy, WeightedRoundRobinPolicy, make_policy, parse_weights,
+)
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+import queue_simulation  # noqa: E402
+
+MEANS = {"X": 180, "Y": 360}
+
+
+def test_fifo_calls_the_longest_waiting_head():
+    policy = FifoPolicy()
+
+    assert policy.choose({"X": 50, "Y": 10}, now=100) == "Y"
+    assert policy.choose({"X": 5, "Y": None}, now=100) == "X"
+    assert policy.choose({"X": None, "Y": None}, now=100) is None
+
+
+def test_weighted_round_robin_interleaves_by_weight():
+    policy = WeightedRoundRobinPolicy({"X": 2, "Y": 1})
+
+    picks = [policy.choose({"X": 0, "Y": 0}, now=0) for _ in range(6)]
+
+    assert picks == ["X", "Y", "X", "X", "Y", "X"]
+
+
+def test_weighted_round_robin_serves_the_only_waiting_lane():
+    policy = WeightedRoundRobinPolicy({"X": 2, "Y": 1})
+
+    assert [policy.choose({"X": None, "Y": 0}, now=0) for _ in range(3)] == ["Y", "Y", "Y"]
+
+
+def test_shortest_expected_job_prefers_the_quicker_lane_until_the_other_is_overdue():
+    policy = ShortestExpectedJobPolicy(MEANS.get, max_wait_seconds=600)
+
+    assert policy.choose({"X": 500, "Y": 0}, now=599) == "X"
+    assert policy.choose({"X": 500, "Y": 0}, now=600) == "Y"
+
+
+def test_make_policy_and_parse_weights():
+    assert parse_weights(" x:3 , Y:1,") == {"X": 3, "Y": 1}
+    assert make_policy("weighted", {"X": 3}).weights == {"X": 3, "Y": 1}
+    with pytest.raises(ValueError):
+        make_policy("sej")
+    with pytest.raises(ValueError):
+        make_policy("random")
+
+
+def test_hall_assigns_free_counters_and_refuses_busy_ones():
+    hall = Hall(["desk-1", "desk-2"], FifoPolicy())
+    hall.arrive("a", "Y", at=1)
+    hall.arrive("b", "X", at=2)
+
+    assert hall.call_next("desk-1", now=3) == ("Y", "a", 1)
+    with pytest.raises(ValueError):
+        hall.call_next("desk-1", now=3)
+    assert hall.free_counters() == ["desk-2"]
+    assert hall.call_next("desk-2", now=3) == ("X", "b", 2)
+    assert hall.waiting() == 0
+    assert hall.complete("desk-1") == ("Y", "a")
+
+
+def simulated_day(policy_name, counters, runs=5):
+    """Mean verification wait (minutes) and desk utilisation over a few fixed-seed days."""
+    args = argparse.Namespace(
+        students=200, slots=8, quick_share=0.5, quick_seconds=MEANS["X"], detailed_seconds=MEANS["Y"],
+        chanakya_seconds=240, counters=counters, chanakya_counters=2,
+    )
+    days = [
+        queue_simulation.simulate(
+            random.Random(seed), args, make_policy(policy_name, {"X": 2, "Y": 1}, MEANS.get, 30 * 60), counters
+        )
+        for seed in range(1, runs + 1)
+    ]
+    return queue_simulation.summarise(days, counters, args.chanakya_counters)
+
+
+def test_lane_policies_cut_the_mean_wait_against_fifo():
+    fifo = simulated_day("fifo", counters=2)
+
+    for policy_name in ("weighted", "sej"):
+        result = simulated_day(policy_name, counters=2)
+        assert result["wait"] < fifo["wait"] * 0.9, policy_name
+        # Every policy keeps a free desk busy whenever someone waits.
+        assert result["utilisation"] == pytest.approx(fifo["utilisation"], abs=0.05)
+
+
+def test_a_second_desk_cuts_the_wait_of_the_single_desk_baseline():
+    assert simulated_day("fifo", counters=2)["wait"] < simulated_day("fifo", counters=1)["wait"] / 5
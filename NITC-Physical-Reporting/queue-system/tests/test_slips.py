@@ -0,0 +1,27 @@
+def test_slip_render_failure_falls_back_to_print_page(fresh_bookings, monkeypatch):
+    queue_app = fresh_bookings
+    with queue_app.app.app_context():
+        booking = queue_app.TokenBooking(
+            student_email="a@nitc.ac.in", slot_time="9:00 AM - 10:00 AM", token_id="T-SLIP",
+            final_registration_completed=True,
+        )
+        queue_app.db.session.add(booking)
+        queue_app.db.session.commit()
+        booking_id = booking.id
+
+    def broken_slip(booking):
+        raise RuntimeError("renderer crashed")
+
+    monkeypatch.setattr(queue_app, "weasyprint", object())
+    monkeypatch.setattr(queue_app, "ensure_slip", broken_slip)
+    client = queue_app.app.test_client()
+    with client.session_transaction() as session:
+        session["admin_email"] = "jimmy@nitc.ac.in"
+
+    response = client.get(f"/final-registration-slip/{booking_id}.pdf")
+
+    assert response.status_code == 302
+    with queue_app.app.test_request_context():
+        assert response.location.endswith(
+            queue_app.url_for("final_registration_print_page", booking_id=booking_id)
+        )
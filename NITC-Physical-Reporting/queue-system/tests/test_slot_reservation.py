@@ -0,0 +1,127 @@
+"""Concurrent bookings must never oversell a slot."""
+import base64
+import io
+import threading
+
+SLOT = "9:00 AM - 10:00 AM"
+PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAAAAAA6fptVAAAACklEQVR4nGP4DwABAQEAsTj2FAAAAABJRU5ErkJggg=="
+)
+
+
+def run_together(count, target):
+    """Start `count` threads on `target(index)` at the same moment and wait for them."""
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def worker(index):
+        barrier.wait()
+        results[index] = target(index)
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def set_capacity(queue_app, units):
+    with queue_app.app.app_context():
+        queue_app.Slot.query.filter_by(time=SLOT).update({queue_app.Slot.capacity: units})
+        queue_app.db.session.commit()
+        queue_app.slot_availability.refresh()
+
+
+def remaining_capacity(queue_app):
+    with queue_app.app.app_context():
+        return queue_app.Slot.query.filter_by(time=SLOT).one().capacity
+
+
+def test_concurrent_reservations_take_exactly_the_free_seats(fresh_bookings):
+    queue_app = fresh_bookings
+    set_capacity(queue_app, 10)
+
+    def reserve(_):
+        with queue_app.app.app_context():
+            reserved = queue_app.reserve_slot_capacity(SLOT, 1)
+            queue_app.db.session.commit()
+            return reserved
+
+    results = run_together(40, reserve)
+
+    assert results.count(True) == 10
+    assert remaining_capacity(queue_app) == 0
+
+
+def test_concurrent_reservations_never_split_a_two_seat_booking(fresh_bookings):
+    queue_app = fresh_bookings
+    set_capacity(queue_app, 5)
+
+    def reserve(_):
+        with queue_app.app.app_context():
+            reserved = queue_app.reserve_slot_capacity(SLOT, 2)
+            queue_app.db.session.commit()
+            return reserved
+
+    results = run_together(20, reserve)
+
+    assert results.count(True) == 2
+    assert remaining_capacity(queue_app) == 1
+
+
+def logged_in_client(queue_app, email):
+    client = queue_app.app.test_client()
+    client.post("/login", json={"role": "student", "email": email, "password": "nitc@1234"})
+    return client
+
+
+def submit_booking(client):
+    response = client.post("/submit-booking", data={
+        "slot": SLOT,
+        "fee": "yes",
+        "docClass10": (io.BytesIO(PNG), "class10.png"),
+        "docClass12": (io.BytesIO(PNG), "class12.png"),
+        "paidReceipt": (io.BytesIO(PNG), "receipt.png"),
+    })
+    return response.get_json()
+
+
+def test_concurrent_submissions_book_exactly_the_seats_available(fresh_bookings):
+    queue_app = fresh_bookings
+    with queue_app.app.app_context():
+        emails = [student.email for student in queue_app.Student.query.order_by(queue_app.Student.id).limit(30)]
+    seats = 12
+    set_capacity(queue_app, seats)
+
+    clients = [logged_in_client(queue_app, email) for email in emails]
+    results = run_together(len(clients), lambda index: submit_booking(clients[index])["success"])
+
+    with queue_app.app.app_context():
+        bookings = queue_app.TokenBooking.query.filter_by(slot_time=SLOT).count()
+        token_ids = {token for (token,) in queue_app.db.session.query(queue_app.TokenBooking.token_id)}
+    assert results.count(True) == seats
+    assert bookings == seats
+    assert len(token_ids) == seats
+    assert remaining_capacity(queue_app) == 0
+
+
+def test_concurrent_submissions_by_one_student_book_once(fresh_bookings):
+    queue_app = fresh_bookings
+    with queue_app.app.app_context():
+        email = queue_app.Student.query.order_by(queue_app.Student.id).first().email
+
+    # Share one login between the clients; repeated logins would hit the per-email rate limit.
+    clients = []
+    for _ in range(10):
+        client = queue_app.app.test_client()
+        with client.session_transaction() as session:
+            session["student_email"] = email
+        clients.append(client)
+    results = run_together(len(clients), lambda index: submit_booking(clients[index]))
+
+    assert [result["success"] for result in results].count(True) == 1
+    assert all("already booked" in result["message"] for result in results if not result["success"])
+    with queue_app.app.app_context():
+        assert queue_app.TokenBooking.query.filter_by(student_email=email).count() == 1
+    assert remaining_capacity(queue_app) == 40 - 1
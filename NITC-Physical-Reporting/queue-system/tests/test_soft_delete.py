@@ -0,0 +1,95 @@
+from datetime import datetime, timedelta
+
+SLOT = "9:00 AM - 10:00 AM"
+
+
+def add_booking(queue_app, email, token_id, **columns):
+    columns.setdefault("sent_to_chanakya", False)
+    booking = queue_app.TokenBooking(
+        student_email=email, slot_time=SLOT, fee_status="yes", token_id=token_id, booked_at=datetime.now(), **columns,
+    )
+    queue_app.db.session.add(booking)
+    queue_app.db.session.commit()
+    return booking.id
+
+
+def test_rejected_bookings_are_hidden_unless_asked_for(fresh_bookings):
+    queue_app = fresh_bookings
+    TokenBooking = queue_app.TokenBooking
+    with queue_app.app.app_context():
+        live_id = add_booking(queue_app, "live@nitc.ac.in", "T-LIVE")
+        rejected_id = add_booking(queue_app, "gone@nitc.ac.in", "T-GONE", rejected_at=datetime.now())
+
+        assert [b.id for b in TokenBooking.query.order_by(TokenBooking.id)] == [live_id]
+        assert TokenBooking.query.filter_by(id=rejected_id).first() is None
+        assert queue_app.db.session.query(queue_app.db.func.count(TokenBooking.id)).scalar() == 1
+        assert queue_app.latest_booking_for("gone@nitc.ac.in") is None
+        # Bulk updates skip rejected rows too.
+        TokenBooking.query.update({TokenBooking.admin1_notes: "seen"}, synchronize_session=False)
+        queue_app.db.session.commit()
+
+        everything = TokenBooking.query.execution_options(include_rejected=True).order_by(TokenBooking.id).all()
+        assert [b.id for b in everything] == [live_id, rejected_id]
+        assert [b.admin1_notes for b in everything] == ["seen", None]
+
+
+def test_rejected_student_may_book_again(fresh_bookings):
+    queue_app = fresh_bookings
+    with queue_app.app.app_context():
+        add_booking(queue_app, "again@nitc.ac.in", "T-OLD", rejected_at=datetime.now())
+        add_booking(queue_app, "again@nitc.ac.in", "T-NEW")
+
+        assert queue_app.latest_booking_for("again@nitc.ac.in").token_id == "T-NEW"
+
+
+def test_shared_document_is_kept_until_its_last_reference_goes(fresh_bookings):
+    queue_app = fresh_bookings
+    with queue_app.app.app_context():
+        queue_app.retain_documents(["shared.png", "shared.png", "own.pdf"])
+        queue_app.retain_documents(["shared.png"])
+        queue_app.db.session.commit()
+
+        assert queue_app.release_documents(["shared.png", "own.pdf"]) == ["own.pdf"]
+        assert queue_app.release_documents(["shared.png"]) == []
+        assert queue_app.release_documents(["shared.png"]) == ["shared.png"]
+        queue_app.db.session.commit()
+        assert queue_app.StoredDocument.query.count() == 0
+
+
+def test_archived_bookings_are_still_found(fresh_bookings):
+    queue_app = fresh_bookings
+    with queue_app.app.app_context():
+        done_id = add_booking(
+            queue_app, "done@nitc.ac.in", "T-DONE", sent_to_chanakya=True,
+            final_registration_completed=True, registration_completed_at=datetime.now() - timedelta(days=2),
+        )
+        # The newest booking always stays in the live table.
+        add_booking(queue_app, "newest@nitc.ac.in", "T-NEWEST")
+
+        assert queue_app.archive_bookings(datetime.now() - timedelta(days=1)) == 1
+
+        assert queue_app.TokenBooking.query.filter_by(id=done_id).first() is None
+        assert queue_app.find_booking(done_id).token_id == "T-DONE"
+        assert queue_app.latest_booking_for("done@nitc.ac.in").token_id == "T-DONE"
+
+
+def test_booking_export_includes_archived_bookings(fresh_bookings):
+    queue_app = fresh_bookings
+    day = datetime.now() - timedelta(days=3)
+    with queue_app.app.app_context():
+        done_id = add_booking(
+            queue_app, "done@nitc.ac.in", "T-DONE", sent_to_chanakya=True,
+            final_registration_completed=True, registration_completed_at=day,
+        )
+        queue_app.TokenBooking.query.filter_by(id=done_id).update({queue_app.TokenBooking.booked_at: day})
+        queue_app.db.session.commit()
+        add_booking(queue_app, "live@nitc.ac.in", "T-LIVE")
+        add_booking(queue_app, "gone@nitc.ac.in", "T-GONE", rejected_at=datetime.now())
+        queue_app.archive_bookings(datetime.now() - timedelta(days=1))
+
+        everything = "".join(queue_app.iter_booking_csv())
+        that_day = "".join(queue_app.iter_booking_csv(day.date()))
+
+    assert everything.index("T-DONE") < everything.index("T-LIVE")
+    assert "T-GONE" not in everything
+    assert "T-DONE" in that_day and "T-LIVE" not in that_day
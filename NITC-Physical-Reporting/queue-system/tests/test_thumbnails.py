@@ -0,0 +1,45 @@
+import base64
+import os
+import threading
+
+PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAAAAAA6fptVAAAACklEQVR4nGP4DwABAQEAsTj2FAAAAABJRU5ErkJggg=="
+)
+
+
+def test_cache_hit_rerenders_a_thumbnail_removed_by_another_worker(queue_app, tmp_path):
+    os.makedirs(queue_app.UPLOAD_DIR, exist_ok=True)
+    with open(os.path.join(queue_app.UPLOAD_DIR, "scan.png"), "wb") as upload:
+        upload.write(PNG)
+    cache = queue_app.ThumbnailCache(str(tmp_path), max_bytes=1 << 20)
+
+    name = cache.get("scan.png")
+    os.remove(tmp_path / name)
+
+    assert cache.get("scan.png") == name
+    assert (tmp_path / name).is_file()
+
+
+def test_workers_rendering_the_same_thumbnail_at_once_all_get_it(queue_app, tmp_path, caplog):
+    os.makedirs(queue_app.UPLOAD_DIR, exist_ok=True)
+    # Large enough that the renders overlap.
+    noise = queue_app.Image.frombytes("RGB", (1500, 1500), os.urandom(1500 * 1500 * 3))
+    noise.save(os.path.join(queue_app.UPLOAD_DIR, "large.png"))
+    # One cache per worker process, all sharing the thumbnail directory.
+    caches = [queue_app.ThumbnailCache(str(tmp_path), max_bytes=1 << 20) for _ in range(8)]
+    barrier = threading.Barrier(len(caches))
+    results = []
+
+    def render(cache):
+        barrier.wait()
+        results.append(cache.get("large.png"))
+
+    threads = [threading.Thread(target=render, args=(cache,)) for cache in caches]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == ["large.jpg"] * len(caches)
+    assert "Could not render thumbnail" not in caplog.text
+    assert os.listdir(tmp_path) == ["large.jpg"]
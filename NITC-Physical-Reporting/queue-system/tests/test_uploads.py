@@ -0,0 +1,58 @@
+import io
+import os
+import threading
+
+from PIL import Image
+from werkzeug.datastructures import FileStorage
+
+
+def png_upload(color):
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), color).save(buffer, "PNG")
+    buffer.seek(0)
+    return FileStorage(buffer, filename="scan.png")
+
+
+def test_same_scan_is_stored_once_and_reported_new_once(queue_app):
+    with queue_app.app.app_context():
+        first = queue_app.save_uploaded_file(png_upload("red"), "class10")
+        second = queue_app.save_uploaded_file(png_upload("red"), "class12")
+
+    assert first[0] == second[0]
+    assert (first[1], second[1]) == (True, False)
+
+
+def test_concurrent_normalisation_of_one_file_does_not_collide(queue_app, caplog):
+    with queue_app.app.app_context():
+        name, _ = queue_app.save_uploaded_file(png_upload("blue"), "class10")
+        queue_app.retain_documents([name])
+        queue_app.db.session.commit()
+
+    threads = [threading.Thread(target=queue_app.normalize_document, args=(name,)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert "Could not normalise" not in caplog.text
+    assert not [entry for entry in os.listdir(queue_app.UPLOAD_DIR) if entry.endswith(".tmp")]
+    with queue_app.app.app_context():
+        assert queue_app.document_is_final(name)
+
+
+def test_document_is_immutable_only_once_normalised(queue_app):
+    with queue_app.app.app_context():
+        name, _ = queue_app.save_uploaded_file(png_upload("green"), "class10")
+        queue_app.retain_documents([name])
+        queue_app.db.session.commit()
+    client = queue_app.app.test_client()
+    with client.session_transaction() as session:
+        session["admin_email"] = "jimmy@nitc.ac.in"
+
+    pending = client.get(f"/uploads/{name}")
+    assert "immutable" not in pending.headers["Cache-Control"]
+    assert "no-cache" in pending.headers["Cache-Control"]
+
+    queue_app.normalize_document(name)
+    final = client.get(f"/uploads/{name}")
+    assert "immutable" in final.headers["Cache-Control"]
@@ -0,0 +1,44 @@
+"""In-memory token-bucket rate limiting.
+
+Each key (a client address, an email) owns a bucket that refills at
+`rate` tokens per second up to `burst`. Checking a key is O(1) and never
+touches the database, so refused requests cost almost nothing. Buckets
+are per process and the least recently used ones are dropped once
+`max_keys` is exceeded; a dropped key simply starts again with a full
+bucket.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+
+
+class TokenBucketLimiter:
+    def __init__(self, rate, burst, max_keys=100_000):
+        self.rate = rate
+        self.burst = burst
+        self._max_keys = max_keys
+        self._buckets = OrderedDict()   # key -> (tokens, last refill time)
+        self._lock = threading.Lock()
+
+    def allow(self, key, cost=1):
+        """Take `cost` tokens from the key's bucket; False if it has too few."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self._max_keys:
+                self._buckets.popitem(last=False)
+            return allowed
+
+    def retry_after(self, cost=1):
+        """Whole seconds an empty bucket needs to afford `cost` again."""
+        return max(1, math.ceil(cost / self.rate))
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
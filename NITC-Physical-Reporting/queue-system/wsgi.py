@@ -0,0 +1,19 @@
+"""Production entry point for a pre-forking WSGI server.
+
+    flask --app app init-db            # once per deployment
+    gunicorn wsgi:app                  # gthread workers, see gunicorn.conf.py
+
+Use threaded (gthread) or gevent workers, never the default sync worker:
+each open /queue/stream holds a connection for as long as the page stays
+open. Equivalent command line:
+
+    gunicorn --worker-class gthread --workers 4 --threads 32 wsgi:app
+
+Configuration comes from the environment: SECRET_KEY (required),
+DATABASE_URL (PostgreSQL, or a SQLite file for a single machine) and the
+DB_POOL_* settings for the connection pool. The pool defaults to one
+connection per GUNICORN_THREADS request thread.
+"""
+from app import create_app
+
+app = create_app()